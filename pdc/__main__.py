@@ -1,9 +1,20 @@
+import hashlib
+import io
 import json
+import os
+import re
 import secrets
 import string
 import sys
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
+from time import perf_counter, sleep
 from glob import glob
+from typing import Iterator
 import uuid
 
 import click
@@ -12,11 +23,37 @@ import requests
 from loguru import logger
 from tqdm import tqdm
 
-from pdc import fgdc
+from pdc import fgdc, firebase, iso
+from pdc import index as pdc_index
+from pdc.checkpoint import Checkpoint
+from pdc.extract import ExtractCache
+from pdc.export import (
+    ShardWriter,
+    get_record_shares,
+    is_record_changed,
+    load_export,
+    load_fingerprints,
+    record_fingerprint,
+)
+from pdc.files import get_file_ccin
+from pdc.firebase import RETRY_STATUS_CODES, FirebaseClient
 from pdc.iso import PDC_ISO
-from pdc.translate import get_french_translated_cioos_record
+from pdc.mapping import get_mapping
+from pdc.regions import DEFAULT_REGION, REGIONS_FILE, assign_regions
+from pdc.service import ConversionService
+from pdc.stub_server import StubServer
+from pdc.translate import (
+    KEYWORDS_DICTIONARY,
+    build_keywords_dictionary,
+    get_french_translated_cioos_record,
+    load_keywords_dictionary,
+)
+from pdc.validation import filter_valid_files, validate_record
 
 PDC_FGDC_URL = "https://www.polardata.ca/pdcsearch/xml/fgdc/13172_fgdc.xml"
+PDC_BASE_URL = os.getenv("PDC_BASE_URL", "https://www.polardata.ca")
+# Namespace of the deterministic record identifiers derived from the CCIN
+CCIN_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://www.polardata.ca")
 logger_format = (
     "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
     "<level>{level: <8}</level> | "
@@ -25,6 +62,7 @@ logger_format = (
 )
 
 logger.remove(0)
+logger.configure(extra={"iso_file": ""})
 logger = logger.bind(iso_file="")
 logger.add(sys.stderr, level="INFO", format=logger_format)
 
@@ -35,6 +73,59 @@ def generate_random_string(length=20):
     return "".join(secrets.choice(alphabet) for _ in range(length))
 
 
+def get_record_uuid(ccin: str, stable: bool = False) -> uuid.UUID:
+    """Generate a record identifier, derived from the CCIN if stable."""
+    if stable:
+        return uuid.uuid5(CCIN_NAMESPACE, str(ccin))
+    return uuid.uuid4()
+
+
+def get_shard(ccin: str, shards: int) -> int:
+    """Return the shard of a CCIN, stable across machines and runs."""
+    return int(hashlib.md5(str(ccin).encode()).hexdigest(), 16) % shards
+
+
+def filter_shard(items: list, shard: tuple[int, int] | None, ccin=str) -> list:
+    """Keep the items, identified by their ``ccin(item)``, of shard ``(i, N)``."""
+    if shard is None:
+        return list(items)
+    index, shards = shard
+    return [item for item in items if get_shard(ccin(item), shards) == index]
+
+
+def _parse_shard(ctx, param, value) -> tuple[int, int] | None:
+    """Parse a ``i/N`` shard option, with ``0 <= i < N``."""
+    if value is None:
+        return None
+    match = re.fullmatch(r"(\d+)/(\d+)", value)
+    if not match or not int(match[1]) < int(match[2]):
+        raise click.BadParameter(f"{value} is not a shard i/N with 0 <= i < N")
+    return int(match[1]), int(match[2])
+
+
+shard_option = click.option(
+    "--shard",
+    type=str,
+    default=None,
+    callback=_parse_shard,
+    help="Only process the shard i/N (0 <= i < N) of the records, split by CCIN",
+)
+
+
+def parse_fields(fields: str | None, xml_format: str) -> list[str] | None:
+    """Parse comma separated record fields, checked against the format record fields."""
+    if not fields:
+        return None
+    fields = [field.strip() for field in fields.split(",")]
+    record_fields = iso.RECORD_FIELDS if xml_format == "iso" else fgdc.RECORD_FIELDS
+    if unknown := sorted(set(fields) - set(record_fields)):
+        raise click.UsageError(
+            f"Unknown {xml_format} record fields: {', '.join(unknown)}"
+            f" (available: {', '.join(record_fields)})"
+        )
+    return fields
+
+
 def load_pdc_records() -> pd.DataFrame:
     """Load the PDC records from the Excel file."""
     pdc_records = pd.concat(
@@ -55,6 +146,73 @@ def cli():
     pass
 
 
+def download_record(
+    ccin: str,
+    xml_type: str,
+    output_dir: Path,
+    base_url: str = PDC_BASE_URL,
+    retries: int = 3,
+    backoff: float = 1,
+    timeout: float = 60,
+) -> dict:
+    """Download a PDC metadata record, retrying on transient failures.
+
+    The record is written to a temporary file and moved in place once
+    complete, so that an interrupted download never leaves a partial record.
+    """
+    url = f"{base_url.rstrip('/')}/pdcsearch/xml/{xml_type}/{ccin}_{xml_type}.xml"
+    output_file = Path(output_dir) / f"{ccin}_{xml_type}.xml"
+    for attempt in range(retries + 1):
+        try:
+            response = requests.get(url, timeout=timeout)
+            status = response.status_code
+            if status == 200:
+                partial_file = output_file.with_suffix(".xml.part")
+                partial_file.write_bytes(response.content)
+                partial_file.replace(output_file)
+                break
+            elif status not in RETRY_STATUS_CODES:
+                break
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as error:
+            status = type(error).__name__
+        if attempt < retries:
+            sleep(backoff * 2**attempt)
+    return {"ccin": ccin, "xml_url": url, "status": status, "attempts": attempt + 1}
+
+
+def download_records(
+    ccins: list[str],
+    xml_type: str,
+    output_dir: Path,
+    overwrite: bool = False,
+    workers: int = 1,
+    progress: bool = True,
+    **kwargs,
+) -> list[dict]:
+    """Download PDC metadata records with ``workers`` concurrent requests."""
+    output_dir = Path(output_dir)
+    ccins = [
+        ccin
+        for ccin in ccins
+        if overwrite or not (output_dir / f"{ccin}_{xml_type}.xml").exists()
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(download_record, ccin, xml_type, output_dir, **kwargs)
+            for ccin in ccins
+        ]
+        return [
+            future.result()
+            for future in tqdm(
+                futures, desc="Downloading metadata", disable=not progress
+            )
+        ]
+
+
 @cli.command()
 @click.argument("ccins", nargs=-1)
 @click.option("--output-dir", type=click.Path(), required=True, default="output")
@@ -62,7 +220,29 @@ def cli():
 @click.option("--overwrite", is_flag=True, default=False)
 @click.option("--sheet-name", type=str, default="Revision PDC")
 @click.option("--ccin-column", type=str, default="ccin_ref_number")
-def download(ccins, output_dir, xml_type, overwrite, sheet_name, ccin_column):
+@click.option(
+    "--base-url",
+    type=str,
+    default=PDC_BASE_URL,
+    help="Polar Data Catalogue base url (default to PDC_BASE_URL or polardata.ca)",
+)
+@click.option("--workers", type=int, default=1, help="Concurrent downloads")
+@click.option("--retries", type=int, default=3, help="Retries of failed downloads")
+@click.option("--timeout", type=float, default=60, help="Request timeout in seconds")
+@shard_option
+def download(
+    ccins,
+    output_dir,
+    xml_type,
+    overwrite,
+    sheet_name,
+    ccin_column,
+    base_url,
+    workers,
+    retries,
+    timeout,
+    shard,
+):
     """Download the metadata for the specified CCINs."""
 
     output_dir = Path(output_dir)
@@ -79,26 +259,27 @@ def download(ccins, output_dir, xml_type, overwrite, sheet_name, ccin_column):
         ccins = pd.read_excel(ccins[0], sheet_name=sheet_name)[ccin_column].tolist()
     else:
         ccins = list(ccins)
+    ccins = filter_shard(ccins, shard)
     logger.info("Downloading metadata for {} records", len(ccins))
-    failed_ccins = []
-    for ccin in tqdm(ccins, desc="Downloading metadata"):
-        output_file = output_dir / f"{ccin}_{xml_type}.xml"
-        if output_file.exists() and not overwrite:
-            continue
-        url = f"https://www.polardata.ca/pdcsearch/xml/{xml_type}/{ccin}_{xml_type}.xml"
-        response = requests.get(url)
-        if response.status_code != 200:
-            logger.warning(
-                "Failed to download {}:{} metadata for record: status={} {}",
-                ccin,
-                xml_type,
-                response.status_code,
-                url,
-            )
-            failed_ccins.append({"ccin": ccin, "xml_url": url})
-            continue
-
-        output_file.write_text(response.text)
+    results = download_records(
+        ccins,
+        xml_type,
+        output_dir,
+        overwrite=overwrite,
+        workers=workers,
+        base_url=base_url,
+        retries=retries,
+        timeout=timeout,
+    )
+    failed_ccins = [result for result in results if result["status"] != 200]
+    for failed in failed_ccins:
+        logger.warning(
+            "Failed to download {}:{} metadata for record: status={} {}",
+            failed["ccin"],
+            xml_type,
+            failed["status"],
+            failed["xml_url"],
+        )
     if failed_ccins:
         logger.warning("Failed to download metadata for {} records", len(failed_ccins))
         pd.DataFrame(failed_ccins).to_markdown(
@@ -106,37 +287,245 @@ def download(ccins, output_dir, xml_type, overwrite, sheet_name, ccin_column):
         )
 
 
-def from_fgdc(
-    files: list[Path] | str,
-    local_dir: Path,
-    user: str,
-) -> None:
-    """Convert PDC FGDC metadata to CIOOS Metadata Form firebase JSON."""
+@cli.command()
+@click.option(
+    "--corpus-dir",
+    type=click.Path(exists=True),
+    required=True,
+    help="Directory of [pdc_]{ccin}_{type}.xml files served by the stub server",
+)
+@click.option("--xml-type", type=click.Choice(["fgdc", "iso"]), default="iso")
+@click.option(
+    "--concurrency",
+    type=str,
+    default="1,4,16",
+    help="Comma separated list of concurrency levels to test",
+)
+@click.option("--latency", type=float, default=0, help="Latency per request (s)")
+@click.option("--error-rate", type=float, default=0, help="Rate of 429/5xx errors")
+@click.option("--truncate-rate", type=float, default=0, help="Rate of truncated bodies")
+@click.option("--slow-rate", type=float, default=0, help="Rate of slow streams")
+@click.option("--retries", type=int, default=3, help="Retries of failed downloads")
+@click.option("--backoff", type=float, default=0.1, help="Initial retry backoff (s)")
+@click.option("--seed", type=int, default=None, help="Seed of the injected faults")
+@click.option("--output-file", type=click.Path(), default=None)
+def loadtest(
+    corpus_dir,
+    xml_type,
+    concurrency,
+    latency,
+    error_rate,
+    truncate_rate,
+    slow_rate,
+    retries,
+    backoff,
+    seed,
+    output_file,
+):
+    """Benchmark downloads against a local PDC stub server with injected faults."""
+    ccins = sorted(
+        get_file_ccin(file) for file in Path(corpus_dir).glob(f"*_{xml_type}.xml")
+    )
+    if not ccins:
+        raise click.UsageError(f"No {xml_type} records found in {corpus_dir}")
+
+    results = []
+    with StubServer(
+        corpus_dir,
+        latency=latency,
+        error_rate=error_rate,
+        truncate_rate=truncate_rate,
+        slow_rate=slow_rate,
+        seed=seed,
+    ) as stub:
+        for workers in [int(level) for level in concurrency.split(",")]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                start = perf_counter()
+                downloads = download_records(
+                    ccins,
+                    xml_type,
+                    tmp_dir,
+                    overwrite=True,
+                    workers=workers,
+                    progress=False,
+                    base_url=stub.url,
+                    retries=retries,
+                    backoff=backoff,
+                )
+                elapsed = perf_counter() - start
+            downloaded = [item for item in downloads if item["status"] == 200]
+            results.append(
+                {
+                    "concurrency": workers,
+                    "records": len(ccins),
+                    "downloaded": len(downloaded),
+                    "failed": len(ccins) - len(downloaded),
+                    "recovered": sum(item["attempts"] > 1 for item in downloaded),
+                    "requests": sum(item["attempts"] for item in downloads),
+                    "elapsed_s": round(elapsed, 3),
+                    "records_per_s": round(len(downloaded) / elapsed, 1),
+                }
+            )
+            logger.info("Load test result: {}", results[-1])
+
+    report = pd.DataFrame(results).to_markdown(index=False)
+    click.echo(report)
+    if output_file:
+        Path(output_file).write_text(report)
+    return results
+
 
+def _list_files(
+    files: list[Path] | str | None, local_dir: Path, pattern: str
+) -> list[Path]:
+    """List the files to convert from a glob, a list or the local directory."""
     if not local_dir.exists():
         local_dir.mkdir()
     if isinstance(files, str):
-        files = [Path(file) for file in glob(files, recursive=True)]
-    elif local_dir.exists():
-        files = local_dir.glob("*_fgdc.xml")
+        return [Path(file) for file in glob(files, recursive=True)]
+    elif files is not None:
+        return list(files)
+    return list(local_dir.glob(pattern))
 
-    # Convert the FGDC metadata to CIOOS Metadata Form
-    results = {}
-    for file in files:
-        random_key = generate_random_string()
-        results[random_key] = fgdc(
-            file,
+
+def _quarantine(quarantine: list[dict] | None, file, stage: str, error: Exception):
+    """Log a failed file and add it with its traceback to the quarantine."""
+    logger.error("Failed to {} {}: {!r}", stage, file, error)
+    if quarantine is not None:
+        quarantine.append(
+            {
+                "file": str(file),
+                "stage": stage,
+                "error": repr(error),
+                "traceback": traceback.format_exc(),
+            }
+        )
+
+
+def load_quarantined_files(quarantine_file) -> list[Path]:
+    """List the files of a quarantine report."""
+    with open(quarantine_file) as f:
+        return list(dict.fromkeys(Path(item["file"]) for item in json.load(f)))
+
+
+def _write_report(report: list[dict], output_file) -> None:
+    """Write a per-file error report in markdown."""
+    logger.warning("Write report of {} errors to {}", len(report), output_file)
+    pd.DataFrame(report).to_markdown(output_file, index=False)
+
+
+def convert_fgdc_record(
+    source,
+    filename: str,
+    ccin: str,
+    user: str,
+    region: str = DEFAULT_REGION,
+    fields: list[str] = None,
+    extracted: dict = None,
+) -> dict:
+    """Convert a PDC FGDC record, from a path or file object, to a CIOOS record.
+
+    The record is mapped from its ``extracted`` intermediate record if given.
+    """
+    return fgdc.main(
+        source,
+        user,
+        filename,
+        ccin,
+        "status",
+        "CC-BY-4.0",
+        region,
+        "dataset",
+        [],
+        fields=fields,
+        extracted=extracted,
+    )
+
+
+def convert_iso_record(
+    source,
+    filename: str,
+    ccin: str,
+    user: str,
+    shares: list[str],
+    identifier: uuid.UUID,
+    region: str = DEFAULT_REGION,
+    fields: list[str] = None,
+    extracted: dict = None,
+    stable_dates: bool = False,
+    doi_cache: dict = None,
+) -> dict:
+    """Convert a PDC ISO record, from a path or file object, to a CIOOS record.
+
+    The record is mapped from its ``extracted`` intermediate record if given.
+    With ``stable_dates``, its revision date is taken from the record.
+    ``doi_cache`` keeps the resolved DOIs across records.
+    """
+    pdc_iso = PDC_ISO(source, extracted=extracted)
+    try:
+        return pdc_iso.to_cioos(
             user,
-            file.name,
-            file.name.replace("_fgdc.xml", ""),
-            "status",
-            "CC-BY-4.0",
-            "amundsen",
-            "dataset",
-            [],
+            filename,
+            ccin,
+            status="submitted",
+            license="CC-BY-4.0",
+            region=region,
+            projects=[],
+            ressourceType=["oceanographic"],
+            shares=shares,
+            distribution=[],
+            eov=[],
+            identifier=identifier,
+            fields=fields,
+            stable_dates=stable_dates,
+            doi_cache=doi_cache,
         )
+    finally:
+        pdc_iso.close()
 
-    return results
+
+def from_fgdc(
+    files: list[Path] | str,
+    local_dir: Path,
+    user: str,
+    stable_ids: bool = False,
+    quarantine: list[dict] = None,
+    region: str = DEFAULT_REGION,
+    files_regions: dict[str, str] = None,
+    fields: list[str] = None,
+    extract_cache: ExtractCache = None,
+) -> Iterator[tuple[str, dict]]:
+    """Convert PDC FGDC metadata to CIOOS Metadata Form firebase JSON.
+
+    Records are yielded one at a time as ``(key, record)`` so that each parsed
+    tree can be released before the next file is read. Files failing to
+    convert are skipped and added to the ``quarantine`` list. Records are
+    assigned to ``region`` unless listed in ``files_regions``, and restricted
+    to ``fields`` if given. With ``extract_cache``, the cached intermediate
+    records are mapped instead of parsing the files again.
+    """
+    files_regions = files_regions or {}
+    for file in _list_files(files, local_dir, "*_fgdc.xml"):
+        ccin = get_file_ccin(file)
+        key = (
+            get_record_uuid(ccin, stable=True).hex
+            if stable_ids
+            else generate_random_string()
+        )
+        try:
+            record = convert_fgdc_record(
+                file,
+                file.name,
+                ccin,
+                user,
+                region=files_regions.get(file.name, region),
+                fields=fields,
+                extracted=extract_cache.get(file, "fgdc") if extract_cache else None,
+            )
+        except Exception as error:
+            _quarantine(quarantine, file, "convert", error)
+            continue
+        yield key, record
 
 
 def from_iso(
@@ -144,72 +533,186 @@ def from_iso(
     local_dir: Path,
     user: str,
     shares: list[str],
-) -> None:
-    """Convert PDC ISO metadata to CIOOS Metadata Form firebase JSON."""
-    if not local_dir.exists():
-        local_dir.mkdir()
+    stable_ids: bool = False,
+    quarantine: list[dict] = None,
+    region: str = DEFAULT_REGION,
+    files_regions: dict[str, str] = None,
+    fields: list[str] = None,
+    extract_cache: ExtractCache = None,
+) -> Iterator[tuple[str, dict]]:
+    """Convert PDC ISO metadata to CIOOS Metadata Form firebase JSON.
 
-    if isinstance(files, str):
-        files = [Path(file) for file in glob(files, recursive=True)]
-    else:
-        files = local_dir.glob("*_iso.xml")
-    # Download the ISO metadata for each record
+    Records are yielded one at a time as ``(key, record)`` so that each parsed
+    tree can be released before the next file is read. Files failing to
+    convert are skipped and added to the ``quarantine`` list. Records are
+    assigned to ``region`` unless listed in ``files_regions``, and restricted
+    to ``fields`` if given. With ``extract_cache``, the cached intermediate
+    records are mapped instead of parsing the files again.
+    """
+    files_regions = files_regions or {}
+    for file in _list_files(files, local_dir, "*_iso.xml"):
+        with logger.contextualize(iso_file=file.name):
+            # firebase uses a random key for the record, unless derived from the CCIN
+            ccin = get_file_ccin(file)
+            identifier = get_record_uuid(ccin, stable=stable_ids)
 
-    # Convert the ISO metadata to CIOOS Metadata Form
-    results = {}
+            try:
+                record = convert_iso_record(
+                    file,
+                    file.name,
+                    ccin,
+                    user,
+                    shares,
+                    identifier,
+                    region=files_regions.get(file.name, region),
+                    fields=fields,
+                    extracted=(
+                        extract_cache.get(file, "iso") if extract_cache else None
+                    ),
+                    stable_dates=stable_ids,
+                )
+            except Exception as error:
+                _quarantine(quarantine, file, "convert", error)
+                continue
+        yield str(identifier.hex), record
+
+
+def snapshot_files(files: list[Path]) -> dict[Path, tuple[int, int]]:
+    """Return the modification time and size of each existing file."""
+    snapshot = {}
     for file in files:
-        with logger.contextualize(iso_file=file.name):
-            # firebase uses a random key for the record
-            identifier = uuid.uuid4()
+        try:
+            stat = file.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
 
-            pdc_iso = PDC_ISO(file)
-            results[str(identifier.hex)] = pdc_iso.to_cioos(
-                user,
-                file.name,
-                file.name.replace("_iso.xml", ""),
-                status="submitted",
-                license="CC-BY-4.0",
-                region="amundsen",
-                projects=[],
-                ressourceType=["oceanographic"],
-                shares=shares,
-                distribution=[],
-                eov=[],
-                identifier=identifier,
-            )
-    return results
 
+def watch_files(
+    list_files, snapshot: dict[Path, tuple[int, int]], interval: float = 2
+) -> Iterator[list[Path]]:
+    """Poll the files every ``interval`` seconds and yield the new or modified ones.
 
-def append_to_existing_records(append_to, records, shares):
-    """Append new records to existing records."""
+    ``list_files`` is called at each poll to pick up the files added to a glob
+    or directory. A file still being written when listed is modified again
+    once complete, and yielded again. Errors listing the files are logged and
+    the files polled again at the next interval.
+    """
+    while True:
+        sleep(interval)
+        try:
+            current = snapshot_files(list_files())
+        except Exception:
+            logger.exception("Failed to list the watched files")
+            continue
+        for file in snapshot.keys() - current.keys():
+            logger.info("{} was removed, its record is kept", file)
+        changed = [file for file, stat in current.items() if snapshot.get(file) != stat]
+        snapshot = current
+        if changed:
+            yield changed
 
-    with open(append_to) as f:
-        previous = json.load(f)
-    if "records" not in previous:
-        previous["records"] = {}
-    if "shares" not in previous:
-        previous["shares"] = {}
-    if any(set(records.keys() & previous["records"].keys())):
-        raise ValueError("Records with similar ID already exists in the append_to file")
 
-    # Append records
-    previous["records"].update(records)
+def scan_fields(
+    files: list[Path],
+    xml_format: str,
+    names: list[str],
+    extract_cache: ExtractCache = None,
+) -> Iterator[tuple[Path, dict]]:
+    """Extract a few fields of each file without converting the records.
 
-    # Append shares
-    for share, users in shares.items():
-        if share not in previous["shares"]:
-            previous["shares"][share] = {}
-        for user, record in users.items():
-            if user not in previous["shares"][share]:
-                previous["shares"][share][user] = {}
-            previous["shares"][share][user] = record
+    FGDC theme and place keywords are combined as ``keywords``. Fields are
+    read from the ``extract_cache`` intermediate records if given.
+    """
+    for file in files:
+        try:
+            if extract_cache is not None:
+                fields = extract_cache.get(file, xml_format)
+            if xml_format == "iso":
+                if extract_cache is None:
+                    pdc_iso = PDC_ISO(file)
+                    fields = pdc_iso.fields
+                    pdc_iso.close()
+                yield file, {name: fields.get(name) for name in names}
+            else:
+                if extract_cache is None:
+                    fields = fgdc.get_fields(file)
+                yield (
+                    file,
+                    {
+                        name: (
+                            fields["themeKeywords"] + fields["placeKeywords"]
+                            if name == "keywords"
+                            else fields.get(name)
+                        )
+                        for name in names
+                    },
+                )
+        except Exception as error:
+            logger.warning("Failed to scan {}: {!r}", file, error)
 
-    return previous
+
+def collect_keywords(
+    files: list[Path], xml_format: str, extract_cache: ExtractCache = None
+) -> set[str]:
+    """Collect the keywords vocabulary of the files without converting them."""
+    return {
+        keyword
+        for _, fields in scan_fields(files, xml_format, ["keywords"], extract_cache)
+        for keyword in fields["keywords"]
+    }
+
+
+def get_files_regions(
+    files: list[Path],
+    xml_format: str,
+    regions_file=REGIONS_FILE,
+    extract_cache: ExtractCache = None,
+) -> dict[str, str]:
+    """Assign the files to the highest priority region intersecting their extent."""
+    bounds = pd.DataFrame(
+        [
+            {"file": file.name, **fields}
+            for file, fields in scan_fields(
+                files, xml_format, ["north", "south", "east", "west"], extract_cache
+            )
+        ],
+        columns=["file", "north", "south", "east", "west"],
+    )
+    regions = assign_regions(
+        bounds["north"], bounds["south"], bounds["east"], bounds["west"], regions_file
+    )
+    for file, file_regions in zip(bounds["file"], regions):
+        if len(file_regions) > 1:
+            logger.info("{} intersects multiple regions: {}", file, file_regions)
+    logger.info(
+        "{}/{} files assigned to a region", sum(map(bool, regions)), len(regions)
+    )
+    return {
+        file: file_regions[0]
+        for file, file_regions in zip(bounds["file"], regions)
+        if file_regions
+    }
+
+
+def get_records_shares(keys, shares: list[str], user: str) -> dict:
+    """Generate the shares mapping for the given record keys."""
+    return {
+        share: {user: {key: {"shared": True} for key in keys}}
+        for share in shares
+        if share
+    }
 
 
 @cli.command()
 @click.option("--xml-format", type=click.Choice(["fgdc", "iso"]), default="iso")
-@click.option("--files", type=str, required=True)
+@click.option(
+    "--files",
+    type=str,
+    default=None,
+    help="Glob of the files to convert, default to all the files in --local-dir",
+)
 @click.option(
     "--local-dir", type=click.Path(exists=True), required=True, default=Path("data")
 )
@@ -227,7 +730,7 @@ def append_to_existing_records(append_to, records, shares):
     "--append-to",
     type=click.Path(),
     default="",
-    help="Append to user records provided in json format",
+    help="Append to user records provided in json format (optionally gzipped)",
 )
 @click.option(
     "--shares",
@@ -241,49 +744,734 @@ def append_to_existing_records(append_to, records, shares):
     default=False,
     help="Translate the metadata to French"
 )
-def convert(xml_format, files, local_dir, output_file, user, shares, append_to, translate):
+@click.option(
+    "--keywords-dictionary",
+    "keywords_dictionary_file",
+    type=click.Path(),
+    default=KEYWORDS_DICTIONARY,
+    help="Keywords translations csv (en,fr) used with --translate, updated with"
+    " the new machine translations (default to KEYWORDS_DICTIONARY)",
+)
+@click.option(
+    "--shard-records",
+    type=int,
+    default=None,
+    help="Maximum number of records per output file",
+)
+@click.option(
+    "--shard-bytes",
+    type=int,
+    default=None,
+    help="Maximum size in bytes of the records in each output file",
+)
+@click.option(
+    "--compress",
+    is_flag=True,
+    default=False,
+    help="Gzip compress the output files",
+)
+@click.option(
+    "--validate",
+    is_flag=True,
+    default=False,
+    help="Skip records failing the input xml or output CIOOS record validation",
+)
+@click.option(
+    "--validation-report",
+    type=click.Path(),
+    default="validation_report.md",
+    help="Per-file report of the records failing validation",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of processes used to validate the input files",
+)
+@click.option(
+    "--stable-ids",
+    is_flag=True,
+    default=False,
+    help="Derive the record keys and identifiers from the CCIN instead of random ones",
+)
+@click.option(
+    "--previous",
+    type=str,
+    default=None,
+    help="Glob of previous outputs/exports to compare the records to"
+    " (implies --stable-ids)",
+)
+@click.option(
+    "--delta",
+    is_flag=True,
+    default=False,
+    help="Only output the records new or changed compared to --previous",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(),
+    default=None,
+    help="Journal of the completed records, appended as each record completes",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Skip the files already in the --checkpoint journal and reuse their records",
+)
+@click.option(
+    "--quarantine-file",
+    type=click.Path(),
+    default="quarantine.json",
+    help="Report of the files that failed to convert, with their tracebacks",
+)
+@click.option(
+    "--only-quarantined",
+    type=click.Path(exists=True),
+    default=None,
+    help="Only convert the files listed in a previous quarantine report",
+)
+@click.option(
+    "--region",
+    type=str,
+    default=DEFAULT_REGION,
+    help="Region of the records, or 'auto' to assign them from their bounding box"
+    f" (default to {DEFAULT_REGION} if no region intersects)",
+)
+@click.option(
+    "--regions-file",
+    type=click.Path(exists=True),
+    default=REGIONS_FILE,
+    help="GeoJSON file of the regions polygons used with --region auto",
+)
+@click.option(
+    "--fields",
+    type=str,
+    default=None,
+    help="Comma separated record fields to convert (ex: keywords,eov), other"
+    " fields and their xml elements or DOI lookup are skipped",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Keep running and convert the new or modified files to new output shards",
+)
+@click.option(
+    "--watch-interval",
+    type=float,
+    default=2,
+    help="Seconds between checks of the files in watch mode",
+)
+@shard_option
+@click.option(
+    "--extract-cache",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory caching the records extracted from the xml files, so that"
+    " mapping changes are applied without parsing the unchanged files again",
+)
+def convert(
+    xml_format,
+    files,
+    local_dir,
+    output_file,
+    user,
+    shares,
+    append_to,
+    translate,
+    keywords_dictionary_file,
+    shard_records,
+    shard_bytes,
+    compress,
+    validate,
+    validation_report,
+    workers,
+    stable_ids,
+    previous,
+    delta,
+    checkpoint,
+    resume,
+    quarantine_file,
+    only_quarantined,
+    region,
+    regions_file,
+    fields,
+    watch,
+    watch_interval,
+    shard,
+    extract_cache,
+):
     """Convert PDC metadata to CIOOS Metadata Form."""
 
+    fields = parse_fields(fields, xml_format)
+    if fields:
+        if previous:
+            raise click.UsageError("--fields can't be compared to --previous records")
+    if delta and not previous:
+        raise click.UsageError("--delta requires --previous")
+    if resume and not checkpoint:
+        raise click.UsageError("--resume requires --checkpoint")
+    if watch:
+        # updated records keep the key of their previous version
+        stable_ids = True
+    fingerprints = {}
+    if previous:
+        stable_ids = True
+        fingerprints = load_fingerprints(sorted(glob(previous, recursive=True)))
+
     shares = shares.split(",")
     local_dir = Path(local_dir)
+    if only_quarantined:
+        files = load_quarantined_files(only_quarantined)
+        logger.info("Convert {} quarantined files", len(files))
+    files_glob, pattern = files, f"*_{xml_format}.xml"
+    files = filter_shard(_list_files(files, local_dir, pattern), shard, get_file_ccin)
+    # changes made during the initial conversion are picked up by the watch
+    snapshot = snapshot_files(files) if watch else None
 
-    # Convert records metadata
-    if xml_format == "fgdc":
-        records = from_fgdc(files, local_dir=local_dir, user=user)
-    elif xml_format == "iso":
-        records = from_iso(files, local_dir=local_dir, user=user, shares=shares)
-
-    records_shares = {}
-    for share in shares:
-        records_shares[share] = {
-            user: {recordID: {"shared": True} for recordID in records.keys()}
-        }
-        # TODO add shares to record sharedWith field
+    if checkpoint:
+        checkpoint = Checkpoint(checkpoint, resume=resume)
+        files = [file for file in files if file.name not in checkpoint.done]
 
-    if translate:
-        records = [get_french_translated_cioos_record(record) for record in records]
+    if extract_cache:
+        extract_cache = ExtractCache(extract_cache)
+    report = []
+    quarantine = []
+    keywords_dictionary = None
+    if translate and (not fields or "keywords" in fields):
+        keywords_dictionary = {}
+    files_regions = {}
+    default_region = DEFAULT_REGION if region == "auto" else region
 
+    writer = ShardWriter(
+        output_file,
+        max_records=shard_records,
+        max_bytes=shard_bytes,
+        compress=compress,
+        wrap_in_list=not append_to,
+        always_shard=watch,
+    )
+    existing_keys, unchanged = set(), 0
     if append_to:
         logger.debug("Appending records to existing records")
-        output = append_to_existing_records(append_to, records, records_shares)
+        existing = load_export(append_to)
+        existing_keys = set(existing["records"])
+        for key in list(existing["records"]):
+            writer.add(
+                key,
+                existing["records"].pop(key),
+                get_record_shares(existing["shares"], key),
+            )
+        del existing
     else:
         logger.debug("Creating new records")
-        output = [{"records": records, "shares": records_shares or {}}]
 
-    logger.debug("Writing output to file: {}", output_file)
-    Path(output_file).write_text(json.dumps(output, indent=2))
+    def _complete_record(key, record) -> dict | None:
+        """Validate, translate and compare a record, return None if dropped."""
+        nonlocal unchanged
+        # partial records are only checked against the input requirements
+        if validate and not fields:
+            errors = validate_record(record)
+            if errors:
+                logger.warning("Invalid CIOOS record {}: {}", key, "; ".join(errors))
+                report.extend(
+                    {"file": record.get("filename"), "stage": "output", "error": error}
+                    for error in errors
+                )
+                return None
+        if translate:
+            record = get_french_translated_cioos_record(record, keywords_dictionary)
+        if previous:
+            changed = is_record_changed(key, record, fingerprints)
+            # later changes of the record are compared to this version
+            fingerprints[key] = record_fingerprint(record)
+            if delta and not changed:
+                unchanged += 1
+                return None
+        return record
+
+    def _convert_files(files: list[Path]) -> int:
+        """Convert files and add their records to the output, return their number."""
+        # files converted again, ex: once completely written, only keep the
+        # errors of their latest conversion
+        names = {str(file) for file in files} | {file.name for file in files}
+        quarantine[:] = [item for item in quarantine if item["file"] not in names]
+        report[:] = [item for item in report if item["file"] not in names]
+        if validate:
+            files, invalid = filter_valid_files(files, xml_format, workers)
+            report.extend(invalid)
+
+        # only the keywords missing from the dictionary are resolved
+        if keywords_dictionary is not None:
+            keywords_dictionary.update(
+                build_keywords_dictionary(
+                    (
+                        keyword
+                        for keyword in collect_keywords(
+                            files, xml_format, extract_cache
+                        )
+                        if keyword.strip() not in keywords_dictionary
+                    ),
+                    path=keywords_dictionary_file,
+                )
+            )
+
+        if region == "auto":
+            for file in files:
+                files_regions.pop(file.name, None)
+            files_regions.update(
+                get_files_regions(files, xml_format, regions_file, extract_cache)
+            )
+
+        # Convert records metadata
+        file_paths = {file.name: file for file in files}
+        if xml_format == "fgdc":
+            records = from_fgdc(
+                files,
+                local_dir=local_dir,
+                user=user,
+                stable_ids=stable_ids,
+                quarantine=quarantine,
+                region=default_region,
+                files_regions=files_regions,
+                fields=fields,
+                extract_cache=extract_cache,
+            )
+        elif xml_format == "iso":
+            records = from_iso(
+                files,
+                local_dir=local_dir,
+                user=user,
+                shares=shares,
+                stable_ids=stable_ids,
+                quarantine=quarantine,
+                region=default_region,
+                files_regions=files_regions,
+                fields=fields,
+                extract_cache=extract_cache,
+            )
+
+        converted = 0
+        for key, record in records:
+            if key in existing_keys:
+                raise ValueError(
+                    "Records with similar ID already exists in the append_to file"
+                )
+            filename = record.get("filename")
+            try:
+                record = _complete_record(key, record)
+            except Exception as error:
+                _quarantine(
+                    quarantine, file_paths.get(filename, filename), "complete", error
+                )
+                continue
+            if checkpoint:
+                checkpoint.add(filename, key, record)
+            if record is not None:
+                writer.add(key, record, get_records_shares([key], shares, user))
+                converted += 1
+            # TODO add shares to record sharedWith field
+        return converted
+
+    if checkpoint and resume:
+        for key, record in checkpoint.records():
+            writer.add(key, record, get_records_shares([key], shares, user))
+
+    _convert_files(files)
+
+    if watch:
+        writer.flush()
+        logger.info("Watching for new or modified files, press Ctrl+C to stop")
+        try:
+            for changed_files in watch_files(
+                lambda: filter_shard(
+                    _list_files(files_glob, local_dir, pattern), shard, get_file_ccin
+                ),
+                snapshot,
+                watch_interval,
+            ):
+                start = perf_counter()
+                try:
+                    converted = _convert_files(changed_files)
+                    writer.flush()
+                except Exception:
+                    # keep watching, the files are converted again once modified
+                    logger.exception(
+                        "Failed to convert {} changed files", len(changed_files)
+                    )
+                    continue
+                logger.info(
+                    "Converted {}/{} changed files in {:.2f}s",
+                    converted,
+                    len(changed_files),
+                    perf_counter() - start,
+                )
+        except KeyboardInterrupt:
+            logger.info("Stop watching")
+
+    if checkpoint:
+        checkpoint.close()
+    output_files = writer.close()
+    logger.info("Output written to: {}", ", ".join(str(file) for file in output_files))
+    if extract_cache:
+        logger.info("Extract cache: {}", extract_cache.stats)
+    if delta:
+        logger.info("Skipped {} unchanged records", unchanged)
+    if report:
+        _write_report(report, validation_report)
+    if quarantine or only_quarantined:
+        logger.log(
+            "WARNING" if quarantine else "INFO",
+            "{} files failed and were quarantined in {}",
+            len(quarantine),
+            quarantine_file,
+        )
+        Path(quarantine_file).write_text(json.dumps(quarantine, indent=2))
 
 
 @cli.command()
+@click.option("--xml-format", type=click.Choice(["fgdc", "iso"]), default="iso")
 @click.option("--files", type=str, required=True)
-@click.option("--attribute", type=str, required=True)
+@click.option("--workers", type=int, default=1, help="Number of processes to use")
+@click.option(
+    "--report",
+    type=click.Path(),
+    default="validation_report.md",
+    help="Per-file report of the records failing validation",
+)
+def validate(xml_format, files, workers, report):
+    """Validate PDC xml metadata records."""
+    files = [Path(file) for file in glob(files, recursive=True)]
+    valid_files, errors = filter_valid_files(files, xml_format, workers)
+    if errors:
+        _write_report(errors, report)
+        raise click.ClickException(f"{len(errors)} files failed validation")
+    return valid_files
+
+
+@cli.command()
+@click.option(
+    "--files",
+    type=str,
+    required=True,
+    help="Glob of the convert output files (json or gzipped json)",
+)
+@click.option(
+    "--database-url",
+    type=str,
+    required=True,
+    envvar="FIREBASE_DATABASE_URL",
+    help="Firebase Realtime Database (or emulator) url",
+)
+@click.option(
+    "--path",
+    type=str,
+    default="",
+    help="Database path under which records and shares are stored",
+)
+@click.option(
+    "--auth",
+    type=str,
+    default=None,
+    envvar="FIREBASE_AUTH",
+    help="Database secret or ID token used to authenticate",
+)
+@click.option(
+    "--namespace", type=str, default=None, help="Database namespace (emulator)"
+)
+@click.option("--batch-size", type=int, default=100, help="Records per request")
+@click.option("--concurrency", type=int, default=4, help="Concurrent requests")
+@click.option("--retries", type=int, default=3, help="Retries of failed requests")
+def publish(
+    files, database_url, path, auth, namespace, batch_size, concurrency, retries
+):
+    """Publish converted records and shares to the firebase database."""
+    pattern, files = files, sorted(glob(files, recursive=True))
+    if not files:
+        raise click.UsageError(f"No files found matching {pattern}")
+    client = FirebaseClient(
+        database_url, path=path, auth=auth, namespace=namespace, retries=retries
+    )
+    published, errors = firebase.publish(
+        (load_export(file) for file in files),
+        client,
+        batch_size=batch_size,
+        concurrency=concurrency,
+    )
+    logger.info("Published {} records from {} files", published, len(files))
+    if errors:
+        raise click.ClickException(f"Failed to publish {len(errors)} batches")
+
+
+@cli.command()
+@click.option(
+    "--files",
+    type=str,
+    required=True,
+    help="Glob of the convert output files to merge (json or gzipped json)",
+)
+@click.option("--output-file", type=click.Path(), required=True)
+@click.option("--shard-records", type=int, default=None, help="Max records per file")
+@click.option("--shard-bytes", type=int, default=None, help="Max bytes per file")
+@click.option("--compress", is_flag=True, default=False, help="Write gzipped json")
+@click.option(
+    "--keep-latest",
+    is_flag=True,
+    default=False,
+    help="Keep the record of the last file, in name order, of duplicate keys,"
+    " ex: records updated in the --watch shards",
+)
+def merge(files, output_file, shard_records, shard_bytes, compress, keep_latest):
+    """Merge convert outputs, ex: of --shard runs, into a single export."""
+    pattern, files = files, sorted(glob(files, recursive=True))
+    if not files:
+        raise click.UsageError(f"No files found matching {pattern}")
+
+    # check the keys of all the files before writing anything
+    keys_files = {}
+    for file in files:
+        for key in load_export(file)["records"]:
+            keys_files.setdefault(key, []).append(file)
+    duplicates = {key: files for key, files in keys_files.items() if len(files) > 1}
+    if duplicates and keep_latest:
+        logger.info("Keeping the latest version of {} updated records", len(duplicates))
+    elif duplicates:
+        for key, duplicate_files in duplicates.items():
+            logger.error("Duplicate record {} in {}", key, ", ".join(duplicate_files))
+        raise click.ClickException(f"{len(duplicates)} duplicate record keys")
+
+    writer = ShardWriter(
+        output_file, max_records=shard_records, max_bytes=shard_bytes, compress=compress
+    )
+    for file in files:
+        export = load_export(file)
+        for key in list(export["records"]):
+            record = export["records"].pop(key)
+            if keys_files[key][-1] != file:
+                continue
+            writer.add(key, record, get_record_shares(export["shares"], key))
+    output_files = writer.close()
+    logger.info(
+        "Merged {} records from {} files to: {}",
+        len(keys_files),
+        len(files),
+        ", ".join(str(file) for file in output_files),
+    )
+
+
+def get_record_converter(
+    user: str = "",
+    shares: list[str] = (),
+    region: str = DEFAULT_REGION,
+    translate: bool = False,
+    keywords_dictionary_file=KEYWORDS_DICTIONARY,
+):
+    """Return a thread safe ``convert(xml, params)`` of the conversion service.
+
+    ``params`` are the ``format`` (iso or fgdc), ``ccin``, ``filename`` and
+    comma separated ``fields`` of the record. Records with a CCIN get a key
+    derived from it and their revision date from the record. The resolved DOIs
+    and keywords translations are kept in memory across records.
+    """
+    lock = threading.Lock()
+    doi_cache = {}
+    keywords_dictionary = (
+        load_keywords_dictionary(keywords_dictionary_file) if translate else None
+    )
+
+    def convert(xml: bytes, params: dict) -> tuple[str, dict]:
+        xml_format = params.get("format", "iso")
+        ccin = params.get("ccin", "")
+        filename = params.get("filename") or (
+            f"{ccin}_{xml_format}.xml" if ccin else ""
+        )
+        fields = params["fields"].split(",") if params.get("fields") else None
+        identifier = get_record_uuid(ccin, stable=bool(ccin))
+        if xml_format == "iso":
+            record = convert_iso_record(
+                io.BytesIO(xml),
+                filename,
+                ccin,
+                user,
+                list(shares),
+                identifier,
+                region=region,
+                fields=fields,
+                stable_dates=bool(ccin),
+                doi_cache=doi_cache,
+            )
+        elif xml_format == "fgdc":
+            record = convert_fgdc_record(
+                io.BytesIO(xml), filename, ccin, user, region=region, fields=fields
+            )
+        else:
+            raise ValueError(f"Unknown xml format {xml_format}")
+
+        if translate:
+            keywords = (record.get("keywords") or {}).get("en", [])
+            with lock:
+                unknown = [
+                    keyword
+                    for keyword in keywords
+                    if keyword.strip() not in keywords_dictionary
+                ]
+                if unknown:
+                    keywords_dictionary.update(
+                        build_keywords_dictionary(
+                            unknown, path=keywords_dictionary_file
+                        )
+                    )
+            record = get_french_translated_cioos_record(record, keywords_dictionary)
+        return identifier.hex, record
+
+    return convert
+
+
+@cli.command()
+@click.option("--host", type=str, default="127.0.0.1")
+@click.option("--port", type=int, default=8080)
+@click.option("--user", type=str, default="", help="User owner of the records")
+@click.option("--shares", type=str, default="", help="Users to share the records with")
+@click.option("--region", type=str, default=DEFAULT_REGION)
+@click.option("--translate", is_flag=True, default=False)
+@click.option(
+    "--keywords-dictionary",
+    "keywords_dictionary_file",
+    type=click.Path(),
+    default=KEYWORDS_DICTIONARY,
+    help="Keywords translations csv (en,fr) used with --translate, updated with"
+    " the new machine translations (default to KEYWORDS_DICTIONARY)",
+)
+def serve(host, port, user, shares, region, translate, keywords_dictionary_file):
+    """Serve record conversions over HTTP, keeping the mappings and caches warm.
+
+    POST the xml record to /convert?format=iso&ccin=<ccin> and GET /stats for
+    the requests latencies.
+    """
+    # compile the mappings once, before the first request
+    get_mapping("iso")
+    get_mapping("fgdc")
+    service = ConversionService(
+        get_record_converter(
+            user=user,
+            shares=[share for share in shares.split(",") if share],
+            region=region,
+            translate=translate,
+            keywords_dictionary_file=keywords_dictionary_file,
+        ),
+        host=host,
+        port=port,
+    )
+    logger.info("Conversion service listening on {}", service.url)
+    try:
+        service.server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stop conversion service: {}", service.get_stats())
+    finally:
+        service.server.server_close()
+
+
+@cli.command()
+@click.option("--files", type=str, required=True, help="Glob of the xml files to index")
+@click.option("--xml-format", type=click.Choice(["fgdc", "iso"]), default="iso")
+@click.option(
+    "--index-file",
+    type=click.Path(),
+    default="pdc_index.sqlite",
+    help="SQLite index file, created if missing",
+)
+@click.option(
+    "--no-prune",
+    is_flag=True,
+    default=False,
+    help="Keep the indexed files missing from --files",
+)
+def index(files, xml_format, index_file, no_prune):
+    """Index the main fields and keywords of xml files, updating only changed files."""
+    files = [Path(file) for file in glob(files, recursive=True)]
+    with closing(pdc_index.connect(index_file)) as connection:
+        return pdc_index.update_index(
+            connection, files, xml_format=xml_format, prune=not no_prune
+        )
+
+
+@cli.command()
+@click.option("--files", type=str, required=False)
+@click.option("--xml-format", type=click.Choice(["fgdc", "iso"]), default="iso")
+@click.option("--attribute", type=str, required=False)
+@click.option(
+    "--fields",
+    type=str,
+    default=None,
+    help="Comma separated CIOOS record fields to convert and output for each file",
+)
 @click.option("--output-type", type=str, required=True, default="set")
 @click.option("--output-file", type=click.Path(), required=False)
-def inspect(files, attribute, output_type, output_file):
-    """Inspect metadata attributes from xml files."""
+@click.option(
+    "--query",
+    type=str,
+    default=None,
+    help="SQL query answered from the --index-file instead of parsing the files",
+)
+@click.option(
+    "--index-file",
+    type=click.Path(),
+    default="pdc_index.sqlite",
+    help="SQLite index generated by the index command",
+)
+@shard_option
+def inspect(
+    files,
+    xml_format,
+    attribute,
+    fields,
+    output_type,
+    output_file,
+    query,
+    index_file,
+    shard,
+):
+    """Inspect metadata attributes from xml files or query the index."""
 
-    files = glob(files)
+    if query:
+        if not Path(index_file).exists():
+            raise click.UsageError(
+                f"Index {index_file} not found, run the index command"
+            )
+        with closing(pdc_index.connect(index_file, read_only=True)) as connection:
+            results = pd.read_sql_query(query, connection)
+        click.echo(results.to_markdown(index=False))
+        if output_file:
+            results.to_json(output_file, orient="records", indent=2)
+        return results
+    elif not files or not (attribute or fields):
+        raise click.UsageError(
+            "--files and --attribute or --fields are required without --query"
+        )
+
+    fields = parse_fields(fields, xml_format)
+    files = filter_shard(glob(files), shard, get_file_ccin)
     results = {}
+    if fields:
+        convert_files = from_iso if xml_format == "iso" else from_fgdc
+        for file in files:
+            kwargs = {"shares": []} if xml_format == "iso" else {}
+            for _, record in convert_files(
+                [Path(file)],
+                Path(file).parent,
+                "",
+                stable_ids=True,
+                fields=fields,
+                **kwargs,
+            ):
+                results[file] = record
+        logger.info("Results of {} files: {}", len(results), results)
+        if output_file:
+            with open(output_file, "w") as f:
+                json.dump(results, f, indent=2)
+        return results
+
     for file in files:
         pdc_iso = PDC_ISO(file)
         if attribute == "keywords":
@@ -0,0 +1,95 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+
+class Checkpoint:
+    """Append-only journal of the records completed during a conversion.
+
+    Each completed file is appended as a json line ``{"file", "key", "record"}``
+    and flushed to disk right away, so that a crashed run can be resumed without
+    converting, resolving or translating the journaled files again. Files that
+    produced no output (ex: unchanged in delta mode) are journaled with a null
+    record.
+    """
+
+    def __init__(self, path, resume: bool = False):
+        self.path = Path(path)
+        self.done = set()
+        if resume and self.path.exists():
+            self._truncate_incomplete_entry()
+            for entry in self._read():
+                self.done.add(entry["file"])
+            logger.info(
+                "Resume from {} journaled files in {}", len(self.done), self.path
+            )
+        elif self.path.exists():
+            logger.warning("Overwrite existing checkpoint journal {}", self.path)
+            self.path.unlink()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _truncate_incomplete_entry(self, block_size: int = 65536) -> None:
+        """Drop the incomplete last line left by a run crashed while writing it.
+
+        New entries are then appended on their own line instead of being glued
+        to the incomplete one.
+        """
+        with open(self.path, "rb+") as f:
+            end = position = f.seek(0, os.SEEK_END)
+            while position > 0:
+                start = max(0, position - block_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                logger.warning(
+                    "Drop incomplete checkpoint entry of {} bytes", end - position
+                )
+                f.truncate(position)
+
+    def _read(self) -> Iterator[dict]:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line may be incomplete if the run crashed while writing
+                    logger.warning("Ignore incomplete checkpoint entry: {}", line[:100])
+
+    def records(self) -> Iterator[tuple[str, dict]]:
+        """Stream the journaled records as ``(key, record)``.
+
+        Only the last entry of each file is kept, ex: files updated in watch mode.
+        """
+        last_entries = {}
+        for index, entry in enumerate(self._read()):
+            last_entries[entry["file"]] = index
+        last_entries = set(last_entries.values())
+        for index, entry in enumerate(self._read()):
+            if index in last_entries and entry["record"] is not None:
+                yield entry["key"], entry["record"]
+
+    def add(self, file: str, key: str = None, record: dict = None) -> None:
+        """Journal a completed file and its record."""
+        self._file.write(
+            json.dumps({"file": file, "key": key, "record": record}, ensure_ascii=False)
+            + "\n"
+        )
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(file)
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,189 @@
+import gzip
+import hashlib
+import json
+from pathlib import Path
+
+from loguru import logger
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_export(path, mode: str = "rt"):
+    """Open a firebase export file, transparently handling gzip compression.
+
+    Files are read as gzip if they start with the gzip magic number, whatever
+    their extension. Files are written as gzip if their name ends with ``.gz``.
+    """
+    path = Path(path)
+    if "r" in mode:
+        with open(path, "rb") as f:
+            is_gzip = f.read(2) == GZIP_MAGIC
+    else:
+        is_gzip = path.suffix == ".gz"
+    if is_gzip:
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_export(path) -> dict:
+    """Load a firebase export and return a single records/shares mapping."""
+    with open_export(path) as f:
+        data = json.load(f)
+
+    # convert writes a list of {"records", "shares"} items
+    items = data if isinstance(data, list) else [data]
+    export = {"records": {}, "shares": {}}
+    for item in items:
+        export["records"].update(item.get("records") or {})
+        merge_shares(export["shares"], item.get("shares") or {})
+    return export
+
+
+def merge_shares(shares: dict, new_shares: dict) -> dict:
+    """Merge a shares mapping ``{share: {user: {recordID: ...}}}`` into another."""
+    for share, users in new_shares.items():
+        for user, records in users.items():
+            shares.setdefault(share, {}).setdefault(user, {}).update(records)
+    return shares
+
+
+def get_record_shares(shares: dict, key: str) -> dict:
+    """Extract the subset of a shares mapping related to a single record."""
+    record_shares = {}
+    for share, users in shares.items():
+        for user, records in users.items():
+            if key in records:
+                record_shares.setdefault(share, {})[user] = {key: records[key]}
+    return record_shares
+
+
+def record_fingerprint(record: dict) -> str:
+    """Hash of a record content."""
+    return hashlib.sha256(
+        json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def load_fingerprints(files) -> dict[str, str]:
+    """Load the fingerprint of each record from exports."""
+    fingerprints = {}
+    for file in files:
+        for key, record in load_export(file)["records"].items():
+            fingerprints[key] = record_fingerprint(record)
+    logger.info("Loaded {} previous records fingerprints", len(fingerprints))
+    return fingerprints
+
+
+def is_record_changed(key: str, record: dict, fingerprints: dict[str, str]) -> bool:
+    """Compare a record to its previous version, return if it is new or changed."""
+    return fingerprints.get(key) != record_fingerprint(record)
+
+
+class ShardWriter:
+    """Write records and shares to one or more firebase export files.
+
+    Records are accumulated until the shard reaches ``max_records`` records or
+    would exceed ``max_bytes`` bytes once written, at which point the shard is written
+    to disk and released from memory. Without limits, a single file is written,
+    unless ``always_shard`` is set to write each flush to a new numbered shard.
+    """
+
+    def __init__(
+        self,
+        output_file,
+        max_records: int = None,
+        max_bytes: int = None,
+        compress: bool = False,
+        wrap_in_list: bool = True,
+        always_shard: bool = False,
+    ):
+        self.output_file = Path(output_file)
+        if compress and self.output_file.suffix != ".gz":
+            self.output_file = self.output_file.with_name(self.output_file.name + ".gz")
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.wrap_in_list = wrap_in_list
+        self.always_shard = always_shard
+        self.files = []
+        self._records = {}
+        self._shares = {}
+        self._size = self._base_size()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.always_shard or self.max_records or self.max_bytes)
+
+    def _shard_path(self) -> Path:
+        if not self.sharded:
+            return self.output_file
+        name = self.output_file.name
+        suffixes = "".join(self.output_file.suffixes)
+        stem = name[: -len(suffixes)] if suffixes else name
+        return self.output_file.with_name(f"{stem}-{len(self.files):05d}{suffixes}")
+
+    @property
+    def _depth(self) -> int:
+        """Nesting depth of the records and shares entries in the written file."""
+        return 2 + self.wrap_in_list
+
+    def _base_size(self) -> int:
+        """Size of a shard without records, with margin for its closing lines."""
+        output = {"records": {}, "shares": {}}
+        return len(
+            json.dumps([output] if self.wrap_in_list else output, indent=2)
+        ) + 4 * (self._depth + 1)
+
+    def _entry_size(self, key: str, value, depth: int) -> int:
+        """Size of a ``"key": value,`` entry written at the given nesting depth."""
+        indent = "\n" + "  " * depth
+        entry = json.dumps(key) + ": " + json.dumps(value, indent=2) + ","
+        return len((indent + entry.replace("\n", indent)).encode("utf-8"))
+
+    def _record_size(self, key: str, record: dict, shares: dict) -> int:
+        """Upper bound of the bytes a record and its shares add to the shard."""
+        depth = self._depth
+        size = self._entry_size(key, record, depth)
+        # each share is counted with its own share and user entries
+        for share, users in shares.items():
+            for user, records in users.items():
+                size += self._entry_size(share, {user: records}, depth)
+        return size
+
+    def add(self, key: str, record: dict, shares: dict = None):
+        """Add a record and its shares to the current shard."""
+        shares = shares or {}
+        size = self._record_size(key, record, shares)
+        if self._records and (
+            (self.max_records and len(self._records) >= self.max_records)
+            or (self.max_bytes and self._size + size > self.max_bytes)
+        ):
+            self.flush()
+        self._records[key] = record
+        merge_shares(self._shares, shares)
+        self._size += size
+
+    def flush(self):
+        """Write the current shard to disk."""
+        if not self._records and (self.files or self.sharded):
+            return
+        output = {"records": self._records, "shares": self._shares}
+        if self.wrap_in_list:
+            output = [output]
+        path = self._shard_path()
+        logger.debug("Writing {} records to file: {}", len(self._records), path)
+        with open_export(path, "wt") as f:
+            json.dump(output, f, indent=2)
+        self.files.append(path)
+        self._records, self._shares, self._size = {}, {}, self._base_size()
+
+    def close(self) -> list[Path]:
+        """Write any remaining records and return the list of written files."""
+        self.flush()
+        return self.files
@@ -0,0 +1,79 @@
+"""Extract stage of the conversion and its on-disk cache.
+
+Records are converted in two stages: each xml record is first extracted with
+the mapping into an intermediate record (plain strings, contacts, keyword
+groups, extents and raw codes), which is then mapped to the CIOOS record by
+applying the roles, language, progress, names and EOV vocabularies.
+
+The intermediate records are cached on disk with pickle, so that changing a
+vocabulary only reruns the mapping stage over the corpus.
+"""
+
+import hashlib
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+
+from pdc import fgdc
+from pdc.iso import PDC_ISO
+from pdc.mapping import MAPPING_FILE
+
+# Increment when a change of the extraction code changes the intermediate records
+EXTRACT_VERSION = 1
+
+
+def extract_record(file, xml_format: str) -> dict:
+    """Extract the intermediate record of a PDC xml file."""
+    if xml_format == "iso":
+        pdc_iso = PDC_ISO(file)
+        try:
+            return pdc_iso.extract()
+        finally:
+            pdc_iso.close()
+    return fgdc.extract(file)
+
+
+@lru_cache
+def _mapping_digest(path=MAPPING_FILE) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class ExtractCache:
+    """Pickle cache of the intermediate records, one entry per file.
+
+    An entry is extracted again if the file (modification time or size), the
+    mapping file or ``EXTRACT_VERSION`` changed since it was written.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _entry(self, file, xml_format: str) -> Path:
+        name = f"{xml_format}:{Path(file).resolve()}"
+        return self.directory / f"{hashlib.sha1(name.encode()).hexdigest()}.pickle"
+
+    def get(self, file, xml_format: str) -> dict:
+        """Return the intermediate record of a file, extracting it if needed."""
+        stat = Path(file).stat()
+        version = (stat.st_mtime_ns, stat.st_size, _mapping_digest(), EXTRACT_VERSION)
+        entry = self._entry(file, xml_format)
+        try:
+            with open(entry, "rb") as f:
+                entry_version, record = pickle.load(f)
+            if entry_version == version:
+                self.stats["hits"] += 1
+                return record
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+
+        self.stats["misses"] += 1
+        record = extract_record(file, xml_format)
+        # written aside and moved in place, as shard runs may share the cache
+        partial = entry.with_suffix(f".{os.getpid()}.part")
+        with open(partial, "wb") as f:
+            pickle.dump((version, record), f, protocol=pickle.HIGHEST_PROTOCOL)
+        partial.replace(entry)
+        return record
@@ -1,19 +1,23 @@
 import re
+from functools import partial
+from types import SimpleNamespace
 
 from loguru import logger
 from lxml import etree as ET
 
-# Define the namespaces
-namespaces = {
-    "gmd": "http://www.isotc211.org/2005/gmd",
-    "gco": "http://www.isotc211.org/2005/gco",
-}
+from pdc.mapping import LazyFields, get_mapping, project_record, register_transform
+
+
+@register_transform("split_places")
+def _split_places(places: str) -> list[str]:
+    """Split semicolon separated place keywords."""
+    return places.split("; ") if places else []
 
 
-def _create_contact(contact, in_citation: bool, role: list[str]) -> dict:
-    """Add a contact to the metadata record."""
-    logger.info("Creating contact: {}", contact)
-    name = contact.find(".//cntper").text
+def _create_contact(values: dict, in_citation: bool, role: list[str]) -> dict:
+    """Add a contact, extracted with the contact section, to the metadata record."""
+    logger.info("Creating contact: {}", values)
+    name = values["name"]
     name = name.split(":")[-1].strip()
     names = re.split("\s+", name)
     if len(names) > 2:
@@ -25,15 +29,15 @@ def _create_contact(contact, in_citation: bool, role: list[str]) -> dict:
         "givenName": " ".join(names[:-1]),
         "lastName": names[-1],
         "inCitation": in_citation,
-        "indEmail": contact.find(".//cntemail").text,
+        "indEmail": values["email"],
         "indName": name,
         "indOrcid": "",
-        "indPosition": _get(contact, ".//cntpos"),
-        "orgAddress": contact.find(".//cntaddr/address").text,
-        "orgCity": contact.find(".//cntaddr/city").text,
-        "orgCountry": contact.find(".//cntaddr/country").text,
+        "indPosition": values["position"],
+        "orgAddress": values["address"],
+        "orgCity": values["city"],
+        "orgCountry": values["country"],
         "orgEmail": "",
-        "orgName": contact.find(".//cntorg").text,
+        "orgName": values["organization"],
         "orgRor": "",
         "orgURL": "",
         "role": role or [],
@@ -56,17 +60,7 @@ def _create_distribution(distribution) -> dict:
     }
 
 
-def _get(item, tag, default=None, level="INFO") -> str:
-    """Get the text of an element with the given tag."""
-    result = item.find(tag)
-    if result is None:
-        logger.log(level, "Item {} not found in ", tag, item)
-        return default
-    return result.text
-
-
-def _get_author(author) -> dict:
-    author_text = author.text
+def _get_author(author_text: str) -> dict:
     if "," in author_text:
         author_text = " ".join(author_text.split(",")[::-1])
 
@@ -84,6 +78,16 @@ def _get_author(author) -> dict:
     }
 
 
+def get_fields(file) -> LazyFields:
+    """Fields of a PDC FGDC metadata record, evaluated on first access."""
+    return get_mapping("fgdc").lazy(ET.parse(file))
+
+
+def extract(file) -> dict:
+    """Return the intermediate record of a PDC FGDC file, before any mapping."""
+    return dict(get_fields(file))
+
+
 def main(
     file,
     userID: str,
@@ -95,85 +99,109 @@ def main(
     ressourceType: list[str],
     sharedWith: list[str],
     projects: list[str] = [],
+    fields: list[str] = None,
+    extracted: dict = None,
 ) -> dict:
-    """Parse a Polar Data Catalogue FGDC metadata record."""
+    """Parse a Polar Data Catalogue FGDC metadata record.
+
+    With ``fields``, only these record fields are computed. With ``extracted``,
+    the fields previously extracted from the file are mapped without parsing it.
+    """
     logger.warning(
         "The FGDC metadata is incomplete and missine some parameters. We recommand using the ISO xml format instead."
     )
-    tree = ET.parse(file)
-
-    return {
-        "userID": userID,
-        "organization": tree.find(".//cntorg").text,
-        "title": {"en": tree.find(".//title").text},
-        "abstract": {"en": tree.find(".//abstract").text},
-        "category": "dataset",  # TODO confirm this is related to the latest version of the schema
-        "contact": [
-            _create_contact(contact, False, ["pointOfContact"])
-            for contact in tree.findall(".//ptcontac")
-        ]
-        + [
-            _create_contact(contact, False, ["owner"])
-            for contact in tree.findall(".//distrib")
-        ]
-        + [
-            _create_contact(contact, False, ["custodian"])
-            for contact in tree.findall(".//metc")
-        ]
-        + [_get_author(contact) for contact in tree.findall(".//origin")],
-        # TODO Convert all dates to ISO 8601 format
-        "created": _get(tree, ".//pubdate"),
-        "datasetIdendifier": _get(tree, ".//idinfo"),
-        "dateStart": _get(tree, ".//begdate"),
-        "dateEnd": _get(tree, ".//enddate"),
-        "datePublished": _get(tree, ".//pubdate"),
-        "dateRevised": _get(tree, ".//revdate"),
-        "distribution": [],
-        "doiCreationStatus": "",
-        "edition": "",
-        "eov": [],
-        "filename": filename,
-        "history": [],  # Related to Lineage
-        "identifier": tree.find(".//idinfo").text,
-        "keywords": {
-            "en": [kw.text for kw in tree.findall(".//themekey")]
-            + tree.find(".//placekt").text.split("; "),
-        },
-        "language": "en",
-        "lastEditedBy": {"displayName": "", "email": ""},
-        "license": license,
-        "limitations": {
-            "en": tree.find(".//purpose").text + "\n\n" + tree.find(".//supplinf").text,
-        },
-        "map": {
+    context = SimpleNamespace(
+        values=extracted if extracted is not None else get_fields(file),
+        userID=userID,
+        filename=filename,
+        recordID=recordID,
+        status=status,
+        license=license,
+        region=region,
+        ressourceType=ressourceType,
+        sharedWith=sharedWith,
+        projects=projects,
+    )
+    # Fields are computed lazily, only when requested
+    record = {name: partial(build, context) for name, build in RECORD_BUILDERS.items()}
+    return project_record(record, fields)
+
+
+# Builders of the CIOOS record fields from the conversion context ``ctx``: the
+# extracted ``values`` of the record and the main arguments
+RECORD_BUILDERS = {
+    "userID": lambda ctx: ctx.userID,
+    "organization": lambda ctx: ctx.values["organization"],
+    "title": lambda ctx: {"en": ctx.values["title"]},
+    "abstract": lambda ctx: {"en": ctx.values["abstract"]},
+    "category": lambda ctx: "dataset",  # TODO confirm this is related to the latest version of the schema
+    "contact": lambda ctx: [
+        _create_contact(contact, False, ["pointOfContact"])
+        for contact in ctx.values["pointsOfContact"]
+    ]
+    + [
+        _create_contact(contact, False, ["owner"])
+        for contact in ctx.values["distributors"]
+    ]
+    + [
+        _create_contact(contact, False, ["custodian"])
+        for contact in ctx.values["metadataContacts"]
+    ]
+    + [_get_author(contact) for contact in ctx.values["originators"]],
+    # TODO Convert all dates to ISO 8601 format
+    "created": lambda ctx: ctx.values["created"],
+    "datasetIdendifier": lambda ctx: ctx.values["identifier"],
+    "dateStart": lambda ctx: ctx.values["dateStart"],
+    "dateEnd": lambda ctx: ctx.values["dateEnd"],
+    "datePublished": lambda ctx: ctx.values["datePublished"],
+    "dateRevised": lambda ctx: ctx.values["dateRevised"],
+    "distribution": lambda ctx: [],
+    "doiCreationStatus": lambda ctx: "",
+    "edition": lambda ctx: "",
+    "eov": lambda ctx: [],
+    "filename": lambda ctx: ctx.filename,
+    "history": lambda ctx: [],  # Related to Lineage
+    "identifier": lambda ctx: ctx.values["identifier"],
+    "keywords": lambda ctx: {
+        "en": ctx.values["themeKeywords"] + ctx.values["placeKeywords"],
+    },
+    "language": lambda ctx: "en",
+    "lastEditedBy": lambda ctx: {"displayName": "", "email": ""},
+    "license": lambda ctx: ctx.license,
+    "limitations": lambda ctx: {
+        "en": ctx.values["purpose"] + "\n\n" + ctx.values["supplementalInformation"],
+    },
+    "map": lambda ctx: {
+        "description": {"en": ""},
+        "north": ctx.values["north"],
+        "south": ctx.values["south"],
+        "east": ctx.values["east"],
+        "west": ctx.values["west"],
+        "polygon": "",
+    },
+    "metadataScope": lambda ctx: "Dataset",
+    "noPlatform": lambda ctx: False,
+    "platforms": lambda ctx: [
+        {
             "description": {"en": ""},
-            "north": tree.find(".//northbc").text,
-            "south": tree.find(".//southbc").text,
-            "east": tree.find(".//eastbc").text,
-            "west": tree.find(".//westbc").text,
-            "polygon": "",
-        },
-        "metadataScope": "Dataset",
-        "noPlatform": False,
-        "platforms": [
-            {
-                "description": {"en": ""},
-                "id": "",
-                "type": "ship",
-            }
-        ],
-        "noTaxa": True,
-        "progress": "onGoing",
-        "projects": projects,
-        "recordID": recordID,
-        "region": region,
-        "resourceType": ressourceType,  # Projects in form
-        "sharedWith": {person: True for person in sharedWith},
-        "status": status,
-        "timeFirstPublished": tree.find(".//metd").text,
-        "vertical": {},
-        "noVerticalExtent": False,
-        "verticalExtentDirection": "depthPositive",
-        "verticalExtentMax": _get(tree, ".//depthmax"),
-        "verticalExtentMin": _get(tree, ".//depthmix"),
-    }
+            "id": "",
+            "type": "ship",
+        }
+    ],
+    "noTaxa": lambda ctx: True,
+    "progress": lambda ctx: "onGoing",
+    "projects": lambda ctx: ctx.projects,
+    "recordID": lambda ctx: ctx.recordID,
+    "region": lambda ctx: ctx.region,
+    "resourceType": lambda ctx: ctx.ressourceType,  # Projects in form
+    "sharedWith": lambda ctx: {person: True for person in ctx.sharedWith},
+    "status": lambda ctx: ctx.status,
+    "timeFirstPublished": lambda ctx: ctx.values["timeFirstPublished"],
+    "vertical": lambda ctx: {},
+    "noVerticalExtent": lambda ctx: False,
+    "verticalExtentDirection": lambda ctx: "depthPositive",
+    "verticalExtentMax": lambda ctx: ctx.values["verticalExtentMax"],
+    "verticalExtentMin": lambda ctx: ctx.values["verticalExtentMin"],
+}
+# Fields of the converted CIOOS records, selectable with ``fields``
+RECORD_FIELDS = tuple(RECORD_BUILDERS)
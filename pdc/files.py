@@ -0,0 +1,9 @@
+"""Naming of the downloaded PDC record files."""
+
+import re
+from pathlib import Path
+
+
+def get_file_ccin(file) -> str:
+    """Return the CCIN of a ``[pdc_]{ccin}_{type}.xml`` record file."""
+    return re.sub(r"_(fgdc|iso)\.xml$", "", Path(file).name).removeprefix("pdc_")
@@ -0,0 +1,141 @@
+"""Publish CIOOS records to a Firebase Realtime Database.
+
+Records and shares are written through the Realtime Database REST API with
+multi-path updates (``PATCH {database_url}/{path}.json``), each request
+containing a batch of records. Requests are sent with bounded concurrency and
+retried with an exponential backoff on connection errors, 429 and 5xx
+responses. The same client works against the Firebase emulator by pointing
+``database_url`` to it and setting its ``namespace``.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator
+
+import requests
+from loguru import logger
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def iter_updates(export: dict) -> Iterator[dict]:
+    """Generate the multi-path updates of each record and its shares."""
+    shares = export.get("shares") or {}
+    for key, record in export.get("records", {}).items():
+        update = {f"records/{key}": record}
+        for share, users in shares.items():
+            for user, records in users.items():
+                if key in records:
+                    update[f"shares/{share}/{user}/{key}"] = records[key]
+        yield update
+
+
+def batch_updates(updates, batch_size: int) -> Iterator[dict]:
+    """Combine the record updates into batches of ``batch_size`` records."""
+    batch, count = {}, 0
+    for update in updates:
+        batch.update(update)
+        count += 1
+        if count >= batch_size:
+            yield batch
+            batch, count = {}, 0
+    if batch:
+        yield batch
+
+
+class FirebaseClient:
+    """Minimal Firebase Realtime Database REST client."""
+
+    def __init__(
+        self,
+        database_url: str,
+        path: str = "",
+        auth: str = None,
+        namespace: str = None,
+        timeout: float = 60,
+        retries: int = 3,
+        backoff: float = 1,
+    ):
+        self.url = f"{database_url.rstrip('/')}/{path.strip('/')}.json"
+        self.params = {}
+        if auth:
+            self.params["auth"] = auth
+        if namespace:
+            self.params["ns"] = namespace
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Session of the current thread, to reuse connections between batches."""
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def update(self, updates: dict) -> None:
+        """Apply a multi-path update, retrying on transient failures."""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.patch(
+                    self.url, params=self.params, json=updates, timeout=self.timeout
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return
+                error = f"status={response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            if attempt < self.retries:
+                delay = self.backoff * 2**attempt
+                logger.warning(
+                    "Firebase update failed ({}), retry in {}s", error, delay
+                )
+                time.sleep(delay)
+        raise RuntimeError(
+            f"Firebase update failed after {self.retries} retries: {error}"
+        )
+
+
+def publish(
+    exports,
+    client: FirebaseClient,
+    batch_size: int = 100,
+    concurrency: int = 4,
+) -> tuple[int, list[Exception]]:
+    """Publish the records of exports and return the number published and errors.
+
+    At most ``concurrency`` batches are in flight at any time so that large
+    exports are not loaded into memory as pending requests.
+    """
+    published, errors = 0, []
+
+    def _publish(batch):
+        client.update(batch)
+        return sum(1 for path in batch if path.startswith("records/"))
+
+    def _collect(futures):
+        nonlocal published
+        for future in futures:
+            try:
+                published += future.result()
+            except Exception as error:
+                logger.error("Failed to publish batch: {}", error)
+                errors.append(error)
+
+    batches = (
+        batch
+        for export in exports
+        for batch in batch_updates(iter_updates(export), batch_size)
+    )
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        for batch in batches:
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+            pending.add(executor.submit(_publish, batch))
+        _collect(wait(pending).done)
+    return published, errors
@@ -0,0 +1,170 @@
+"""Local SQLite index of the main fields of a PDC records corpus.
+
+The index is built once from the xml files and updated incrementally: only the
+files added or modified (by modification time and size) since the last update
+are parsed again. Queries are then answered from the index without parsing
+the xml records.
+
+Tables:
+    records: one row per file with its main CIOOS fields
+    keywords: one row per file keyword, with its type (theme, place, ...)
+"""
+
+import sqlite3
+from pathlib import Path
+
+from loguru import logger
+
+from pdc import fgdc
+from pdc.files import get_file_ccin
+from pdc.iso import PDC_ISO, _apply_language_mapping, _apply_progress_mapping
+
+RECORD_COLUMNS = {
+    "path": "TEXT PRIMARY KEY",
+    "mtime": "REAL",
+    "size": "INTEGER",
+    "xml_format": "TEXT",
+    "ccin": "TEXT",
+    "title": "TEXT",
+    "abstract": "TEXT",
+    "created": "TEXT",
+    "date_start": "TEXT",
+    "date_end": "TEXT",
+    "language": "TEXT",
+    "progress": "TEXT",
+    "north": "REAL",
+    "south": "REAL",
+    "east": "REAL",
+    "west": "REAL",
+    "error": "TEXT",
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS records (
+    {", ".join(f"{name} {type_}" for name, type_ in RECORD_COLUMNS.items())}
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    path TEXT REFERENCES records(path) ON DELETE CASCADE,
+    keyword TEXT,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS keywords_path ON keywords(path);
+CREATE INDEX IF NOT EXISTS keywords_keyword ON keywords(keyword);
+"""
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_index_fields(file: Path, xml_format: str) -> tuple[dict, list[tuple]]:
+    """Extract the indexed fields and the ``(keyword, type)`` of a record."""
+    ccin = get_file_ccin(file)
+    language = progress = None
+    if xml_format == "iso":
+        pdc_iso = PDC_ISO(file)
+        try:
+            fields = pdc_iso.fields
+            language = _apply_language_mapping(fields["language"])
+            progress = _apply_progress_mapping(fields["progress"])
+            keywords = [
+                (keyword, group["type"])
+                for group in pdc_iso._get_keyword_groups()
+                for keyword in group["keywords"]
+                if keyword
+            ]
+        finally:
+            pdc_iso.close()
+    else:
+        fields = fgdc.get_fields(file)
+        keywords = [(keyword, "theme") for keyword in fields["themeKeywords"]] + [
+            (keyword, "place") for keyword in fields["placeKeywords"]
+        ]
+    record = {
+        "ccin": ccin,
+        "title": fields.get("title"),
+        "abstract": fields.get("abstract"),
+        "created": fields.get("created"),
+        "date_start": fields.get("dateStart"),
+        "date_end": fields.get("dateEnd"),
+        "language": language,
+        "progress": progress,
+        **{
+            bound: _to_float(fields.get(bound))
+            for bound in ("north", "south", "east", "west")
+        },
+    }
+    return record, keywords
+
+
+def connect(index_file, read_only: bool = False) -> sqlite3.Connection:
+    """Open the index, creating its tables if needed."""
+    if read_only:
+        return sqlite3.connect(f"file:{Path(index_file).as_posix()}?mode=ro", uri=True)
+    connection = sqlite3.connect(index_file)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def update_index(
+    connection: sqlite3.Connection,
+    files: list[Path],
+    xml_format: str = "iso",
+    prune: bool = True,
+) -> dict:
+    """Index the new or modified files and return the number of each update.
+
+    With ``prune``, the indexed files of the same format missing from
+    ``files`` are removed from the index.
+    """
+    indexed = {
+        path: (mtime, size)
+        for path, mtime, size in connection.execute(
+            "SELECT path, mtime, size FROM records WHERE xml_format = ?", (xml_format,)
+        )
+    }
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "errors": 0}
+    for file in files:
+        file = Path(file)
+        stat = file.stat()
+        path = str(file)
+        if indexed.get(path) == (stat.st_mtime, stat.st_size):
+            stats["unchanged"] += 1
+            continue
+
+        try:
+            record, keywords = extract_index_fields(file, xml_format)
+            record["error"] = None
+        except Exception as error:
+            logger.warning("Failed to index {}: {!r}", file, error)
+            record, keywords = {"error": repr(error)}, []
+            stats["errors"] += 1
+        record.update(
+            path=path, mtime=stat.st_mtime, size=stat.st_size, xml_format=xml_format
+        )
+        with connection:
+            connection.execute("DELETE FROM records WHERE path = ?", (path,))
+            connection.execute(
+                f"INSERT INTO records ({', '.join(record)}) "
+                f"VALUES ({', '.join('?' * len(record))})",
+                list(record.values()),
+            )
+            connection.executemany(
+                "INSERT INTO keywords (path, keyword, type) VALUES (?, ?, ?)",
+                [(path, keyword, type_) for keyword, type_ in keywords],
+            )
+        stats["updated" if path in indexed else "added"] += 1
+
+    if prune:
+        removed = set(indexed) - {str(file) for file in files}
+        with connection:
+            connection.executemany(
+                "DELETE FROM records WHERE path = ?", [(path,) for path in removed]
+            )
+        stats["removed"] = len(removed)
+    logger.info("Index updated: {}", stats)
+    return stats
@@ -1,18 +1,17 @@
+import os
 import re
+import threading
 import uuid
 import yaml
+from functools import cached_property, partial
 from pathlib import Path
+from types import SimpleNamespace
 from datetime import datetime, timezone
 from loguru import logger
 from lxml import etree as ET
 import requests
 
-# Define the namespaces
-namespaces = {
-    "gmd": "http://www.isotc211.org/2005/gmd",
-    "gco": "http://www.isotc211.org/2005/gco",
-    "gml": "http://www.opengis.net/gml",
-}
+from pdc.mapping import LazyFields, get_mapping, project_record, register_transform
 
 MAP_ISO_LANGUAGE = {
     "eng; CAN": "en",
@@ -38,9 +37,15 @@ ROLES_MAPPING = {
     "principalInvestigator": "principalInvestigator",
 }
 
+DOI_URL = "https://doi.org"
+# DOI caches are shared by the threads of the conversion service
+doi_cache_lock = threading.Lock()
+
+
 EOV_TO_KEYWORDS = yaml.safe_load(open(Path(__file__).parent / "eov_to_keywords.yaml"))
 
 
+@register_transform("date")
 def _parse_date(date: str) -> str:
     """Parse a date."""
     if not date or date == "Undefined":
@@ -77,6 +82,24 @@ def _apply_mapping(mapping: dict, value: str) -> str:
     return result
 
 
+def _apply_language_mapping(language: str) -> str:
+    """Map an ISO language code to the CIOOS language."""
+    return _apply_mapping(MAP_ISO_LANGUAGE, language)
+
+
+def _apply_progress_mapping(progress: str) -> str:
+    """Map an ISO progress code to the CIOOS progress."""
+    return _apply_mapping(MAP_ISO_STATUS, progress)
+
+
+@register_transform("split_keywords")
+def _split_keywords(keywords: list[str]) -> list[str]:
+    """Split comma separated keywords and drop duplicates, preserving order."""
+    return list(
+        dict.fromkeys(item.strip() for kw in keywords if kw for item in kw.split(","))
+    )
+
+
 def _contact_name(author_text:str, name_mapping:dict =NAMES_MAPPING) -> list[str]:
     """Get the name of a contact.
     
@@ -106,41 +129,59 @@ def _contact_name(author_text:str, name_mapping:dict =NAMES_MAPPING) -> list[str
 
 
 class PDC_ISO:
-    def __init__(self, file, name_mapping=NAMES_MAPPING):
+    def __init__(self, file, name_mapping=NAMES_MAPPING, extracted: dict = None):
+        """Parse an ISO record from a path or file object.
+
+        With ``extracted``, the fields previously extracted from the file (see
+        ``extract``) are mapped without parsing the file again.
+        """
         self.file = file
-        self.tree = ET.parse(file)
         self.name_mapping = name_mapping
+        self.mapping = get_mapping("iso")
+        self.tree = None
+        if extracted is not None:
+            self.fields = extracted
+        else:
+            self.tree = ET.parse(file)
+
+    def close(self):
+        """Release the parsed xml tree."""
+        self.tree = None
+        self.__dict__.pop("fields", None)
+
+    @cached_property
+    def fields(self) -> LazyFields:
+        """Record fields of the ISO mapping, evaluated on first access."""
+        return self.mapping.lazy(self.tree)
+
+    def extract(self) -> dict:
+        """Return the intermediate record: all the fields, before any mapping."""
+        return dict(self.fields)
 
     def _create_contact(
-        self, contact, in_citation: bool, role: list[str] = None,
+        self, values: dict, in_citation: bool, role: list[str] = None,
     ) -> dict:
-        """Add a contact to the metadata record."""
-        logger.debug("Creating contact: {}", contact)
-        names = _contact_name(
-            self.get(".//gmd:individualName/gco:CharacterString", contact), self.name_mapping
-        )
+        """Add a contact, extracted with the contact section, to the metadata record."""
+        logger.debug("Creating contact: {}", values)
+        values = values or dict.fromkeys(self.mapping["contact"])
+        names = _contact_name(values["individualName"], self.name_mapping)
 
         return {
             "givenNames": " ".join(names[:-1]),
             "lastName": names[-1],
             "inCitation": in_citation,
-            "indEmail": self.get(
-                ".//gmd:electronicMailAddress/gco:CharacterString", contact
-            ),
+            "indEmail": values["email"],
             "indName": " ".join(names),
             "indOrcid": "",
             # "indPosition": self.get(contact,".//cntpos"),
-            "orgAddress": self.get(".//gmd:deliveryPoint/gco:CharacterString", contact),
-            "orgCity": self.get(".//gmd:city/gco:CharacterString", contact),
-            "orgCountry": self.get(".//gmd:country/gco:CharacterString", contact),
-            "orgEmail": self.get(
-                ".//gmd:electronicMailAddress/gco:CharacterString", contact
-            ),
-            "orgName": self.get(".//gmd:organisationName/gco:CharacterString", contact),
+            "orgAddress": values["address"],
+            "orgCity": values["city"],
+            "orgCountry": values["country"],
+            "orgEmail": values["email"],
+            "orgName": values["organisationName"],
             "orgRor": "",
             "orgURL": "",
-            "role": role
-            or [_apply_role_mapping(self.get(".//gmd:CI_RoleCode", contact))],
+            "role": role or [_apply_role_mapping(values["role"])],
         }
 
     @staticmethod
@@ -159,39 +200,22 @@ class PDC_ISO:
             },
         }
 
-    def get(self, tag, item=None, default=None, level="DEBUG") -> str:
-        """Extract specific tag element within item."""
-        result = (item or self.tree).find(tag, namespaces=namespaces)
-        if result is None:
-            logger.log(level, "Item {} not found in ", tag, item)
-            return default
-        return result.text
+    def _get_keyword_groups(self) -> list[dict]:
+        """Extract the descriptive keywords groups."""
+        return self.fields["descriptiveKeywords"]
 
     def get_places(self) -> list[str]:
         """Extract the places from the metadata record."""
-        places = []
-        for kw in self.tree.findall(
-            ".//gmd:descriptiveKeywords", namespaces=namespaces
-        ):
-            if (
-                kw.find(".//gmd:MD_KeywordTypeCode", namespaces=namespaces).text
-                == "place"
-            ):
-                places.append(
-                    kw.find(
-                        ".//gmd:keyword/gco:CharacterString", namespaces=namespaces
-                    ).text
-                )
-        return places
+        return [
+            group["keyword"]
+            for group in self._get_keyword_groups()
+            if group["type"] == "place"
+        ]
 
     def _get_suggested_citation_contacts(self) -> tuple[list[dict], str]:
         """Extract the contacts from the citation."""
         contacts = []
-        citation = self.tree.findall(
-            ".//gmd:citation/gmd:CI_Citation/gmd:otherCitationDetails/gco:CharacterString",
-            namespaces=namespaces,
-        )
-        citation = citation[0].text if citation else None
+        citation = self.fields["citation"]
         if not citation or citation.lower() in ("unpublished data", "unpublished"):
             return contacts, citation
         coauthors = re.split(r"\(|\d{4}\.", citation)
@@ -246,19 +270,9 @@ class PDC_ISO:
     def _get_keywords(self) -> list[str]:
         """Retrive theme type keywords."""
         keywords = []
-        for kw in self.tree.findall(
-            ".//gmd:descriptiveKeywords", namespaces=namespaces
-        ):
-            if (
-                kw.find(".//gmd:MD_KeywordTypeCode", namespaces=namespaces).text
-                == "theme"
-            ):
-                keywords += [
-                    item.text
-                    for item in kw.findall(
-                        ".//gmd:keyword/gco:CharacterString", namespaces=namespaces
-                    )
-                ]
+        for group in self._get_keyword_groups():
+            if group["type"] == "theme":
+                keywords += group["keywords"]
         if not keywords:
             logger.warning("No keywords found in metadata")
         return keywords
@@ -281,20 +295,76 @@ class PDC_ISO:
         if not eovs:
             logger.warning("No EOV found in keywords: {}", keywords)
             eovs = ["other"]
-        return list(set(eovs))
-    def _get_doi(self, ccin, doi_prefixes:list=None ) -> str:
+        return sorted(set(eovs))
+
+    def _get_doi(
+        self,
+        ccin,
+        doi_prefixes: list = None,
+        doi_base_url: str = None,
+        timeout=30,
+        cache: dict = None,
+    ) -> str:
+        """Return the DOI url of the record if it resolves.
+
+        Resolved DOI urls are looked up in and added to ``cache`` if given.
+        """
         if not ccin:
             return ""
+        if cache is not None:
+            with doi_cache_lock:
+                if ccin in cache:
+                    return cache[ccin]
         if not doi_prefixes:
             doi_prefixes = ["10.21963"]
+        # DOI_BASE_URL is read here, after the .env file is loaded, so that it
+        # can point to a local stand-in for testing
+        doi_base_url = (doi_base_url or os.getenv("DOI_BASE_URL") or DOI_URL).rstrip(
+            "/"
+        )
 
         for prefix in doi_prefixes:
-            doi_url = f"https://doi.org/{prefix}/{ccin}"
-            response = requests.get(doi_url)
+            response = requests.get(f"{doi_base_url}/{prefix}/{ccin}", timeout=timeout)
             if response.status_code == 200:
-                return doi_url
+                doi = f"{DOI_URL}/{prefix}/{ccin}"
+                if cache is not None:
+                    with doi_cache_lock:
+                        cache[ccin] = doi
+                return doi
         return ""
 
+    def _get_contacts(self) -> list[dict]:
+        """Combine the record contacts and check them against the citation."""
+        fields = self.fields
+
+        # Verify if contacts match the suggested citation
+        citation_contacts, citation = self._get_suggested_citation_contacts()
+        responsible_parties = [
+            self._create_contact(contact, in_citation=True)
+            for contact in fields["citedResponsibleParties"]
+        ]
+        if len(citation_contacts) > len(responsible_parties) and not "et al." in citation:
+            logger.warning(
+                "file={} Citation contacts ({} contacts) do not match the responsible parties ({} contacts): citation={}",
+                self.file,
+                len(citation_contacts),
+                len(responsible_parties),
+                citation,
+            )
+
+        return self._combine_contacts(
+            [
+                self._create_contact(
+                    fields["pointOfContact"], False, ["pointOfContact"]
+                ),
+                self._create_contact(
+                    fields["metadataMaintenance"], False, ["custodian"]
+                ),
+                self._create_contact(fields["distributor"], False, ["distributor"]),
+                *responsible_parties,
+            ]
+        )
+
     def to_cioos(
         self,
         userID: str,
@@ -311,141 +381,135 @@ class PDC_ISO:
         identifier: uuid.UUID,
         doiStatusCreation: str = "findable",
         doi_prefixes: list[str] = None,
+        doi_base_url: str = None,
+        fields: list[str] = None,
+        stable_dates: bool = False,
+        doi_cache: dict = None,
     ) -> dict:
-        """Parse a Polar Data Catalogue FGDC metadata record."""
-
-        # Verify if contacts match the suggested citation
-        citation_contacts, citation = self._get_suggested_citation_contacts()
-        responsible_parties = [
-            self._create_contact(contact, in_citation=True)
-            for contact in self.tree.findall(
-                ".//gmd:CI_Citation/gmd:citedResponsibleParty",
-                namespaces=namespaces,
-            )
-        ]
-        if len(citation_contacts) > len(responsible_parties) and not "et al." in citation:
-            logger.warning(
-                "file={} Citation contacts ({} contacts) do not match the responsible parties ({} contacts): citation={}",
-                self.file,
-                len(citation_contacts),
-                len(responsible_parties),
-                citation,
-            )
-
-        return {
-            "userID": userID,
-            # "organization": "",
+        """Parse a Polar Data Catalogue FGDC metadata record.
+
+        With ``fields``, only these record fields are computed: the xml
+        elements, and the DOI lookup, unrelated to them are skipped. With
+        ``stable_dates``, the revision date is the metadata date stamp instead
+        of the conversion time, so that converting a record again is identical.
+        ``doi_cache`` keeps the resolved DOIs across records.
+        """
+
+        context = SimpleNamespace(
+            pdc_iso=self,
+            values=self.fields,
+            userID=userID,
+            filename=filename,
+            recordID=recordID,
+            status=status,
+            license=license,
+            region=region,
+            projects=projects,
+            ressourceType=ressourceType,
+            shares=shares,
+            distribution=distribution,
+            eov=eov,
+            identifier=identifier,
+            doiStatusCreation=doiStatusCreation,
+            doi_prefixes=doi_prefixes,
+            doi_base_url=doi_base_url,
+            stable_dates=stable_dates,
+            doi_cache=doi_cache,
+        )
+        # Fields are computed lazily, only when requested
+        record = {
+            name: partial(build, context) for name, build in RECORD_BUILDERS.items()
+        }
+        return project_record(record, fields)
+
+
+def _revision_date(ctx) -> str:
+    """Revision date of the record, the conversion time unless ``stable_dates``."""
+    if ctx.stable_dates:
+        return ctx.values["dateRevised"]
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+# Builders of the CIOOS record fields from the conversion context ``ctx``: the
+# PDC_ISO record, its extracted ``values`` and the to_cioos arguments
+RECORD_BUILDERS = {
+    "userID": lambda ctx: ctx.userID,
+    # "organization": "",
+    "title": lambda ctx: {"en": ctx.values["title"]},
+    "abstract": lambda ctx: {"en": ctx.values["abstract"]},
+    "category": lambda ctx: "dataset",  # TODO confirm this is related to the latest version of the schema
+    "limitations": lambda ctx: "",
+    "contacts": lambda ctx: ctx.pdc_iso._get_contacts(),
+    "created": lambda ctx: ctx.values["created"],
+    "datasetIdentifier": lambda ctx: ctx.pdc_iso._get_doi(
+        ctx.values["datasetURI"].split("=")[-1],
+        ctx.doi_prefixes,
+        ctx.doi_base_url,
+        cache=ctx.doi_cache,
+    ),
+    "dateStart": lambda ctx: ctx.values["dateStart"],
+    "dateEnd": lambda ctx: ctx.values["dateEnd"],
+    "datePublished": lambda ctx: ctx.values["datePublished"],
+    "dateRevised": _revision_date,
+    "distribution": lambda ctx: ctx.distribution,
+    "doiCreationStatus": lambda ctx: ctx.doiStatusCreation,
+    "edition": lambda ctx: ctx.values["edition"],
+    "eov": lambda ctx: ctx.eov or ctx.pdc_iso._get_eov_from_keywords(),
+    "filename": lambda ctx: ctx.filename,
+    "history": lambda ctx: [],  # Related to Lineage
+    # example  "ccin-147b8485-a0b4-450d-8847-de51158b04ec"
+    "identifier": lambda ctx: "ccin-" + str(ctx.identifier),
+    "keywords": lambda ctx: {"en": ctx.values["keywords"], "fr": []},
+    "language": lambda ctx: _apply_language_mapping(ctx.values["language"]),
+    "lastEditedBy": lambda ctx: {"displayName": "", "email": ""},
+    "license": lambda ctx: ctx.license,  # eg "CC-BY-4.0"
+    "comments": lambda ctx: {
+        "en": (
+            "## Purpose: "
+            + ctx.values["purpose"]
+            + "\n\n## Supplemental Information: "
+            + ctx.values["supplementalInformation"]
+        ),
+    },
+    "map": lambda ctx: {
+        "description": {
+            "en": " - ".join(ctx.pdc_iso.get_places()),
+        },
+        "north": ctx.values["north"],
+        "south": ctx.values["south"],
+        "east": ctx.values["east"],
+        "west": ctx.values["west"],
+        "polygon": "",
+    },
+    "metadataScope": lambda ctx: "Dataset",  # TODO map to record type
+    "noPlatform": lambda ctx: True,
+    "platforms": lambda ctx: [],
+    "noTaxa": lambda ctx: True,
+    "progress": lambda ctx: _apply_progress_mapping(ctx.values["progress"]),
+    "projects": lambda ctx: ctx.projects,
+    "recordID": lambda ctx: ctx.recordID,
+    "region": lambda ctx: ctx.region,
+    "resourceType": lambda ctx: ctx.ressourceType,  # Projects in form
+    "sharedWith": lambda ctx: {person: True for person in ctx.shares},
+    "status": lambda ctx: ctx.status,
+    "timeFirstPublished": lambda ctx: ctx.values["timeFirstPublished"],
+    "vertical": lambda ctx: {},
+    "noVerticalExtent": lambda ctx: True,
+    "verticalExtentDirection": lambda ctx: "depthPositive",
+    "verticalExtentMax": lambda ctx: None,  # unavailable in PDC metadata
+    "verticalExtentMin": lambda ctx: None,  # unavailable in PDC metadata
+    "associated_resources": lambda ctx: [
+        {
+            "association_type": "IsIdenticalTo",
+            "association_type_iso": "crossReference",
+            "authority": "URL",
+            "code": ctx.values["datasetURI"],
             "title": {
-                "en": self.get(".//gmd:title/gco:CharacterString"),
-            },
-            "abstract": {"en": self.get(".//gmd:abstract/gco:CharacterString")},
-            "category": "dataset",  # TODO confirm this is related to the latest version of the schema
-            "limitations": "",
-            "contacts": self._combine_contacts(
-                [
-                    self._create_contact(
-                        self.tree.find(".//gmd:pointOfContact", namespaces=namespaces),
-                        False,
-                        ["pointOfContact"],
-                    ),
-                    self._create_contact(
-                        self.tree.find(
-                            ".//gmd:metadataMaintenance", namespaces=namespaces
-                        ),
-                        False,
-                        ["custodian"],
-                    ),
-                    self._create_contact(
-                        self.tree.find(".//gmd:distributor", namespaces=namespaces),
-                        False,
-                        ["distributor"],
-                    ),
-                    *responsible_parties,
-                ]
-            ),
-            "created": _parse_date(self.get(".//gmd:dateStamp/gco:Date")),
-            "datasetIdentifier": self._get_doi(
-                self.get(".//gmd:dataSetURI/gco:CharacterString").split("=")[-1], doi_prefixes
-            ),
-            "dateStart": _parse_date(self.get(".//gml:beginPosition")),
-            "dateEnd": _parse_date(self.get(".//gml:endPosition")),
-            "datePublished": _parse_date(self.get(".//gmd:dateStamp/gco:Date")),
-            "dateRevised": datetime.now(timezone.utc)
-            .isoformat()
-            .replace("+00:00", "Z"),
-            "distribution": distribution,
-            "doiCreationStatus": doiStatusCreation,
-            "edition": self.get(".//gmd:version") or "1.0",
-            "eov": eov or self._get_eov_from_keywords(),
-            "filename": filename,
-            "history": [],  # Related to Lineage
-            "identifier": "ccin-" + str(
-                identifier
-            ),  # example  "147b8485-a0b4-450d-8847-de51158b04ec"
-            "keywords": {
-                "en": list(
-                    set(
-                        item.strip()
-                        for kw in self.tree.findall(
-                            ".//gmd:keyword/gco:CharacterString", namespaces=namespaces
-                        )
-                        for item in kw.text.split(",")
-                    )
-                ),
-                "fr": []
+                "en": "Polar Data Catalogue equivalent record",
+                "fr": "Enregistrement équivalent du Catalogue de données polaires",
             },
-            "language": _apply_mapping(
-                MAP_ISO_LANGUAGE, self.get(".//gmd:language/gco:CharacterString")
-            ),
-            "lastEditedBy": {"displayName": "", "email": ""},
-            "license": license,  # eg "CC-BY-4.0"
-            "comments": {
-                "en": (
-                    "## Purpose: "
-                    + self.get(".//gmd:purpose/gco:CharacterString")
-                    + "\n\n## Supplemental Information: "
-                    + self.get(".//gmd:supplementalInformation/gco:CharacterString")
-                ),
-            },
-            "map": {
-                "description": {
-                    "en": " - ".join(self.get_places()),
-                },
-                "north": self.get(".//gmd:northBoundLatitude/gco:Decimal"),
-                "south": self.get(".//gmd:southBoundLatitude/gco:Decimal"),
-                "east": self.get(".//gmd:eastBoundLongitude/gco:Decimal"),
-                "west": self.get(".//gmd:westBoundLongitude/gco:Decimal"),
-                "polygon": "",
-            },
-            "metadataScope": "Dataset",  # TODO map to record type
-            "noPlatform": True,
-            "platforms": [],
-            "noTaxa": True,
-            "progress": _apply_mapping(
-                MAP_ISO_STATUS, self.get(".//gmd:status/gmd:MD_ProgressCode")
-            ),
-            "projects": projects,
-            "recordID": recordID,
-            "region": region,
-            "resourceType": ressourceType,  # Projects in form
-            "sharedWith": {person: True for person in shares},
-            "status": status,
-            "timeFirstPublished": _parse_date(self.get(".//gmd:dateStamp/gco:Date")),
-            "vertical": {},
-            "noVerticalExtent": True,
-            "verticalExtentDirection": "depthPositive",
-            "verticalExtentMax": None,  # unavailable in PDC metadata
-            "verticalExtentMin": None,  # unavailable in PDC metadata
-            "associated_resources": [
-                {
-                    "association_type": "IsIdenticalTo",
-                    "association_type_iso": "crossReference",
-                    "authority": "URL",
-                    "code": self.get(".//gmd:dataSetURI/gco:CharacterString"),
-                    "title": {
-                        "en": "Polar Data Catalogue equivalent record",
-                        "fr": "Enregistrement équivalent du Catalogue de données polaires",
-                    },
-                }
-            ],
         }
+    ],
+}
+# Fields of the converted CIOOS records, selectable with ``fields``
+RECORD_FIELDS = tuple(RECORD_BUILDERS)
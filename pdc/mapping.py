@@ -0,0 +1,156 @@
+"""Declarative mapping of the PDC metadata records to CIOOS record fields.
+
+The source paths are defined in ``mapping.yaml`` and compiled once per process
+into reusable ``lxml.etree.XPath`` evaluators. Fields can be evaluated all at
+once with ``Mapping.extract`` or on first access with ``Mapping.lazy``.
+
+Evaluated fields only hold plain values (strings, lists and dicts of the
+selected sections) and form the serializable intermediate record from which
+the CIOOS record is mapped.
+"""
+
+from collections.abc import Mapping as BaseMapping
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+from lxml import etree as ET
+
+MAPPING_FILE = Path(__file__).parent / "mapping.yaml"
+SELECTS = ("text", "texts", "element", "elements")
+
+TRANSFORMS = {}
+
+
+def register_transform(name: str):
+    """Register a function as a named transform usable in the mapping file."""
+
+    def decorator(func):
+        TRANSFORMS[name] = func
+        return func
+
+    return decorator
+
+
+class Field:
+    """Compiled source path of a single field."""
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        namespaces: dict = None,
+        select: str = "text",
+        transform: str = None,
+        default=None,
+        required: bool = False,
+        section: str = None,
+    ):
+        if select not in SELECTS:
+            raise ValueError(f"Unknown select {select} for field {name}")
+        self.name = name
+        self.path = path
+        self.select = select
+        self.transform = transform
+        self.default = default
+        self.required = required
+        self.section = section
+        # fields of the section, linked by the Mapping
+        self.section_fields = None
+        self.xpath = ET.XPath(path, namespaces=namespaces or {}, smart_strings=False)
+
+    def __call__(self, item):
+        """Evaluate the field within the given element or tree."""
+        elements = self.xpath(item)
+        if self.section_fields is not None:
+            elements = [
+                {name: field(element) for name, field in self.section_fields.items()}
+                for element in elements
+            ]
+        if self.select == "elements":
+            return elements
+        elif self.select == "element":
+            return elements[0] if elements else None
+        elif self.select == "texts":
+            value = [element.text for element in elements]
+        else:
+            value = elements[0].text if elements else None
+
+        if self.transform:
+            value = TRANSFORMS[self.transform](value)
+        if not value and self.default is not None:
+            return self.default
+        return value
+
+
+class LazyFields(BaseMapping):
+    """Read-only mapping of fields evaluated on first access and cached."""
+
+    def __init__(self, fields: dict[str, Field], item):
+        self._fields = fields
+        self._item = item
+        self._values = {}
+
+    def __getitem__(self, name: str):
+        if name not in self._values:
+            self._values[name] = self._fields[name](self._item)
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+
+class Mapping:
+    """Compiled mapping of a metadata format, organized by section."""
+
+    def __init__(self, spec: dict):
+        namespaces = spec.get("namespaces")
+        self.sections = {
+            section: {
+                name: Field(name, namespaces=namespaces, **options)
+                for name, options in fields.items()
+            }
+            for section, fields in spec.items()
+            if section != "namespaces"
+        }
+        for fields in self.sections.values():
+            for field in fields.values():
+                if field.section and field.select in ("element", "elements"):
+                    field.section_fields = self.sections[field.section]
+
+    def __getitem__(self, section: str) -> dict[str, Field]:
+        return self.sections[section]
+
+    def extract(self, item, section: str = "record", fields=None) -> dict:
+        """Evaluate the fields of a section within the given element or tree."""
+        return {
+            name: field(item)
+            for name, field in self[section].items()
+            if fields is None or name in fields
+        }
+
+    def lazy(self, item, section: str = "record") -> LazyFields:
+        """Return the fields of a section, evaluated only when accessed."""
+        return LazyFields(self[section], item)
+
+
+def project_record(record: dict, fields: list[str] = None) -> dict:
+    """Evaluate the lazy (callable) values of a record, restricted to ``fields``."""
+    if fields is not None and (unknown := set(fields) - set(record)):
+        raise ValueError(f"Unknown record fields: {', '.join(sorted(unknown))}")
+    return {
+        name: value() if callable(value) else value
+        for name, value in record.items()
+        if fields is None or name in fields
+    }
+
+
+@lru_cache
+def get_mapping(xml_format: str) -> Mapping:
+    """Load and compile the mapping of a metadata format."""
+    with open(MAPPING_FILE) as f:
+        spec = yaml.safe_load(f)
+    return Mapping(spec[xml_format])
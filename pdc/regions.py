@@ -0,0 +1,139 @@
+"""Assign CIOOS regions to records from their bounding boxes.
+
+Region polygons are loaded from a GeoJSON file (``regions.geojson`` by default,
+in priority order) and intersected with all the records bounding boxes at once
+with numpy. A bounding box intersects a polygon if one of them has a vertex
+within the other or if their edges cross.
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+REGIONS_FILE = Path(__file__).parent / "regions.geojson"
+DEFAULT_REGION = "amundsen"
+
+
+@lru_cache
+def load_regions(path=REGIONS_FILE) -> list[tuple[str, np.ndarray]]:
+    """Load the ``(region, polygon vertices)`` of a GeoJSON file."""
+    with open(path) as f:
+        features = json.load(f)["features"]
+    regions = []
+    for feature in features:
+        geometry = feature["geometry"]
+        polygons = (
+            [geometry["coordinates"]]
+            if geometry["type"] == "Polygon"
+            else geometry["coordinates"]
+        )
+        for polygon in polygons:
+            # only the exterior ring is considered
+            regions.append(
+                (feature["properties"]["region"], np.array(polygon[0], float))
+            )
+    return regions
+
+
+def _points_in_polygon(x: np.ndarray, y: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Ray casting test of points (any shape) within a polygon."""
+    inside = np.zeros(np.shape(x), bool)
+    for (x1, y1), (x2, y2) in zip(polygon[:-1], polygon[1:]):
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+        inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _edges_cross(boxes: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Test if any edge of each box (n, 4 corners) crosses an edge of the polygon."""
+    # box edges (n, 4, 1) against polygon edges (1, 1, m)
+    ax, ay = boxes[:, :, 0, None], boxes[:, :, 1, None]
+    corners = np.roll(boxes, -1, axis=1)
+    bx, by = corners[:, :, 0, None], corners[:, :, 1, None]
+    cx, cy = polygon[None, None, :-1, 0], polygon[None, None, :-1, 1]
+    dx, dy = polygon[None, None, 1:, 0], polygon[None, None, 1:, 1]
+    crosses = (
+        _orientation(ax, ay, bx, by, cx, cy) != _orientation(ax, ay, bx, by, dx, dy)
+    ) & (_orientation(cx, cy, dx, dy, ax, ay) != _orientation(cx, cy, dx, dy, bx, by))
+    return crosses.any(axis=(1, 2))
+
+
+def _intersects(north, south, east, west, polygon: np.ndarray) -> np.ndarray:
+    """Vectorized intersection of bounding boxes with a polygon."""
+    min_x, min_y = polygon.min(axis=0)
+    max_x, max_y = polygon.max(axis=0)
+    candidates = (west <= max_x) & (east >= min_x) & (south <= max_y) & (north >= min_y)
+    result = np.zeros(north.shape, bool)
+    if not candidates.any():
+        return result
+    north, south, east, west = (
+        bound[candidates] for bound in (north, south, east, west)
+    )
+
+    boxes = np.stack(
+        [
+            np.stack([west, south], axis=-1),
+            np.stack([east, south], axis=-1),
+            np.stack([east, north], axis=-1),
+            np.stack([west, north], axis=-1),
+        ],
+        axis=1,
+    )
+    box_in_polygon = _points_in_polygon(
+        np.concatenate([boxes[:, :, 0], ((west + east) / 2)[:, None]], axis=1),
+        np.concatenate([boxes[:, :, 1], ((north + south) / 2)[:, None]], axis=1),
+        polygon,
+    ).any(axis=1)
+    polygon_in_box = (
+        (polygon[None, :, 0] >= west[:, None])
+        & (polygon[None, :, 0] <= east[:, None])
+        & (polygon[None, :, 1] >= south[:, None])
+        & (polygon[None, :, 1] <= north[:, None])
+    ).any(axis=1)
+    result[candidates] = box_in_polygon | polygon_in_box | _edges_cross(boxes, polygon)
+    return result
+
+
+def assign_regions(
+    north, south, east, west, regions_file=REGIONS_FILE
+) -> list[list[str]]:
+    """Return the regions, in priority order, intersecting each bounding box.
+
+    Bounds are array-like of the same length and may contain strings or missing
+    values, in which case no region is assigned. Boxes crossing the
+    antimeridian (west > east) are split in two.
+    """
+    north, south, east, west = (
+        np.array([_to_float(value) for value in bound], float)
+        for bound in (north, south, east, west)
+    )
+    crosses_antimeridian = west > east
+    matches = []
+    for region, polygon in load_regions(regions_file):
+        match = _intersects(
+            north, south, np.where(crosses_antimeridian, 180, east), west, polygon
+        ) | (
+            crosses_antimeridian
+            & _intersects(north, south, east, np.full(west.shape, -180.0), polygon)
+        )
+        matches.append((region, match))
+
+    return [
+        list(dict.fromkeys(region for region, match in matches if match[index]))
+        for index in range(len(north))
+    ]
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
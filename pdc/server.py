@@ -0,0 +1,50 @@
+"""Base of the local threaded HTTP servers: the conversion service and the stub."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Request handler logging the requests at the trace level."""
+
+    def log_message(self, format, *args):
+        logger.trace(format, *args)
+
+
+class ThreadedServer:
+    """Threaded local HTTP server, served from a background thread.
+
+    Subclasses return their request handler class, usually a ``QuietHandler``
+    bound to the server instance, from ``_handler()``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.debug("{} listening on {}", type(self).__name__, self.url)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        raise NotImplementedError
@@ -0,0 +1,105 @@
+"""Long-running local service converting PDC xml records on demand.
+
+The service keeps the compiled mappings, the EOV table and the translation
+caches in memory between requests, so that converting a single record does not
+pay the start-up cost of the command line tool.
+
+Routes:
+    POST /convert?format=iso&ccin=...&fields=...: convert the xml request body
+        and return ``{"key", "record", "latency"}``
+    GET /stats: number of requests, errors and conversion latencies in seconds
+"""
+
+import json
+import threading
+import time
+from typing import Callable
+from urllib.parse import parse_qsl, urlparse
+
+from loguru import logger
+from lxml import etree as ET
+
+from pdc.server import QuietHandler, ThreadedServer
+
+
+class ConversionService(ThreadedServer):
+    """Threaded local HTTP conversion service.
+
+    ``convert(xml, params)`` converts the posted xml bytes, given the query
+    parameters, to a ``(key, record)`` and must be thread safe. The conversion
+    latency of each request is returned in the ``X-Conversion-Time`` header.
+    """
+
+    def __init__(
+        self,
+        convert: Callable[[bytes, dict], tuple[str, dict]],
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.convert = convert
+        self.lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+        super().__init__(host, port)
+
+    def get_stats(self) -> dict:
+        """Return the requests statistics, with the mean conversion latency."""
+        with self.lock:
+            stats = dict(self.stats)
+        stats["latency_mean"] = stats["latency_total"] / (stats["requests"] or 1)
+        return stats
+
+    def _record(self, latency: float, error: bool):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["errors"] += error
+            self.stats["latency_total"] += latency
+            self.stats["latency_max"] = max(self.stats["latency_max"], latency)
+
+    def _handler(self):
+        service = self
+
+        class Handler(QuietHandler):
+            def do_GET(self):
+                if urlparse(self.path).path != "/stats":
+                    return self.send_error(404)
+                self._send_json(200, service.get_stats())
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != "/convert":
+                    return self.send_error(404)
+                params = dict(parse_qsl(url.query))
+                xml = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+                start = time.perf_counter()
+                try:
+                    key, record = service.convert(xml, params)
+                    status, body = 200, {"key": key, "record": record}
+                except (ET.XMLSyntaxError, ValueError) as error:
+                    status, body = 400, {"error": repr(error)}
+                except Exception as error:
+                    logger.exception("Failed to convert record {}", params)
+                    status, body = 500, {"error": repr(error)}
+                latency = time.perf_counter() - start
+                service._record(latency, status != 200)
+                logger.info("Converted {} in {:.3f}s: {}", params, latency, status)
+
+                body["latency"] = latency
+                self._send_json(status, body, {"X-Conversion-Time": f"{latency:.6f}"})
+
+            def _send_json(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
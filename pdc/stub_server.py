@@ -0,0 +1,127 @@
+"""Local stand-in of the Polar Data Catalogue and doi.org servers.
+
+The server exposes the PDC xml records of a corpus directory under the same
+paths as polardata.ca (``/pdcsearch/xml/{type}/{ccin}_{type}.xml``) and
+imitates doi.org by redirecting ``/{prefix}/{ccin}`` to a landing page for
+the CCINs present in the corpus. Faults can be injected to test and benchmark
+the network code offline: latency, 429/5xx errors, truncated bodies and slow
+streams.
+"""
+
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+from pdc.server import QuietHandler, ThreadedServer
+
+XML_PATH = re.compile(r"^/pdcsearch/xml/(?P<type>\w+)/(?P<ccin>[^/]+)_(?P=type)\.xml$")
+DOI_PATH = re.compile(r"^/(?P<prefix>10\.\d+)/(?P<ccin>[^/]+)$")
+LANDING_PATH = re.compile(r"^/landing/(?P<prefix>10\.\d+)/(?P<ccin>[^/]+)$")
+
+
+class StubServer(ThreadedServer):
+    """Threaded local PDC and DOI server with fault injection.
+
+    Rates are probabilities, between 0 and 1, applied to each request.
+    """
+
+    def __init__(
+        self,
+        corpus_dir,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        error_rate: float = 0,
+        error_codes: tuple[int] = (429, 500, 503),
+        truncate_rate: float = 0,
+        slow_rate: float = 0,
+        slow_chunk_delay: float = 0.05,
+        seed: int = None,
+    ):
+        self.corpus_dir = Path(corpus_dir)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.truncate_rate = truncate_rate
+        self.slow_rate = slow_rate
+        self.slow_chunk_delay = slow_chunk_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "truncated": 0, "slow": 0}
+        super().__init__(host, port)
+
+    def find_record(self, ccin: str, xml_type: str) -> Path | None:
+        """Find a record of the corpus, named ``[pdc_]{ccin}_{type}.xml``."""
+        for name in (f"{ccin}_{xml_type}.xml", f"pdc_{ccin}_{xml_type}.xml"):
+            if (self.corpus_dir / name).exists():
+                return self.corpus_dir / name
+
+    def _draw(self, rate: float, stat: str) -> bool:
+        with self.lock:
+            if rate and self.random.random() < rate:
+                self.stats[stat] += 1
+                return True
+        return False
+
+    def _handler(self):
+        stub = self
+
+        class Handler(QuietHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.stats["requests"] += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub._draw(stub.error_rate, "errors"):
+                    with stub.lock:
+                        code = stub.random.choice(stub.error_codes)
+                    self.send_response(code)
+                    if code == 429:
+                        self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if match := XML_PATH.match(self.path):
+                    file = stub.find_record(match["ccin"], match["type"])
+                    if file is None:
+                        return self.send_error(404)
+                    return self._send_body(file.read_bytes(), "application/xml")
+                elif match := DOI_PATH.match(self.path):
+                    if stub.find_record(match["ccin"], "iso") is None and (
+                        stub.find_record(match["ccin"], "fgdc") is None
+                    ):
+                        return self.send_error(404, "DOI Not Found")
+                    self.send_response(302)
+                    self.send_header(
+                        "Location", f"/landing/{match['prefix']}/{match['ccin']}"
+                    )
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif match := LANDING_PATH.match(self.path):
+                    return self._send_body(
+                        f"<html>{match['prefix']}/{match['ccin']}</html>".encode(),
+                        "text/html",
+                    )
+                else:
+                    self.send_error(404)
+
+            def _send_body(self, body: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if stub._draw(stub.truncate_rate, "truncated"):
+                    self.wfile.write(body[: len(body) // 2])
+                    self.close_connection = True
+                elif stub._draw(stub.slow_rate, "slow"):
+                    for start in range(0, len(body), 1024):
+                        self.wfile.write(body[start : start + 1024])
+                        self.wfile.flush()
+                        time.sleep(stub.slow_chunk_delay)
+                else:
+                    self.wfile.write(body)
+
+        return Handler
@@ -1,7 +1,10 @@
+import csv
 import os
 import boto3
 import hashlib
 import json
+import threading
+from functools import lru_cache
 from loguru import logger
 from dotenv import load_dotenv
 
@@ -13,10 +16,15 @@ AWS_REGION = os.getenv("AWS_REGION")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESSKEYID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRETACCESSKEY")
 TERMINOLOGY_CSV = os.getenv("TERMINOLOGY_CSV")
+# english to french keywords translations (en,fr csv), updated by each conversion
+KEYWORDS_DICTIONARY = os.getenv("KEYWORDS_DICTIONARY", "keywords_dictionary.csv")
+# AWS Translate maximum text size is 10,000 bytes
+MAX_BATCH_BYTES = 9000
 
 
+@lru_cache
 def get_translator():
-    """Get the AWS Translate client."""
+    """Get the AWS Translate client, created once per process."""
     if not AWS_REGION or not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
         logger.error("AWS credentials are not set in environment variables.")
         raise ValueError("AWS credentials are not set in environment variables.")
@@ -50,18 +58,19 @@ def get_cache_key(text, source_language, target_language):
 
 
 cache = load_cache()
+# translations are shared by the threads of the conversion service
+cache_lock = threading.Lock()
 
 
 def translate(text, source_language, target_language, terminology_name=None):
 
-    aws_translate = get_translator()
-
-    cache = load_cache()
     cache_key = get_cache_key(text, source_language, target_language)
-    if cache_key in cache:
-        logger.debug("Use cached translation")
-        return cache[cache_key]
+    with cache_lock:
+        if cache_key in cache:
+            logger.debug("Use cached translation")
+            return cache[cache_key]
 
+    aws_translate = get_translator()
     result = aws_translate.translate_text(
         Text=text,
         SourceLanguageCode=source_language,
@@ -70,13 +79,89 @@ def translate(text, source_language, target_language, terminology_name=None):
     )
 
     translated_text = result.get("TranslatedText")
-    cache[cache_key] = translated_text
-    save_cache(cache)
+    with cache_lock:
+        cache[cache_key] = translated_text
+        save_cache(cache)
 
     return translated_text
 
-def get_french_translated_cioos_record(record):
-    """Translate a CIOOS record to English using AWS Translate."""
+def load_keywords_dictionary(path=KEYWORDS_DICTIONARY) -> dict[str, str]:
+    """Load an english to french keywords dictionary csv file (en,fr columns)."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {
+            row["en"]: row["fr"] for row in csv.DictReader(f) if row.get("fr")
+        }
+
+
+def save_keywords_dictionary(dictionary: dict[str, str], path=KEYWORDS_DICTIONARY):
+    """Save an english to french keywords dictionary csv file."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["en", "fr"])
+        writer.writerows(sorted(dictionary.items()))
+
+
+def translate_terms(terms: list[str], source_language="en", target_language="fr"):
+    """Translate a list of short terms in as few requests as possible.
+
+    Terms are joined one per line in batches below the AWS size limit, and
+    translated individually if a batch translation does not preserve the lines.
+    """
+    batches, batch = [], []
+    for term in terms:
+        if batch and len("\n".join(batch + [term]).encode()) > MAX_BATCH_BYTES:
+            batches.append(batch)
+            batch = []
+        batch.append(term)
+    if batch:
+        batches.append(batch)
+
+    translations = {}
+    for batch in batches:
+        logger.info("Translate a batch of {} terms", len(batch))
+        lines = translate(
+            "\n".join(batch), source_language, target_language, TERMINOLOGY_CSV
+        ).split("\n")
+        if len(lines) != len(batch):
+            logger.warning("Batch translation split mismatch, translate terms one by one")
+            lines = [
+                translate(term, source_language, target_language, TERMINOLOGY_CSV)
+                for term in batch
+            ]
+        translations.update(zip(batch, (line.strip() for line in lines)))
+    return translations
+
+
+def build_keywords_dictionary(keywords, path=KEYWORDS_DICTIONARY) -> dict[str, str]:
+    """Resolve the french translation of a keywords vocabulary.
+
+    Keywords are first looked up in the keywords dictionary file, then the
+    unknown ones are machine translated in batch, with the ``TERMINOLOGY_CSV``
+    AWS terminology, and saved to the dictionary file.
+    """
+    vocabulary = sorted({keyword.strip() for keyword in keywords if keyword and keyword.strip()})
+    dictionary = load_keywords_dictionary(path)
+    unknown = [keyword for keyword in vocabulary if keyword not in dictionary]
+    logger.info(
+        "{} keywords: {} in dictionary, {} to translate",
+        len(vocabulary),
+        len(vocabulary) - len(unknown),
+        len(unknown),
+    )
+    if unknown:
+        dictionary.update(translate_terms(unknown))
+        if path:
+            save_keywords_dictionary(dictionary, path)
+    return {keyword: dictionary[keyword] for keyword in vocabulary}
+
+
+def get_french_translated_cioos_record(record, keywords_dictionary: dict = None):
+    """Translate a CIOOS record to French using AWS Translate.
+
+    Keywords are translated from ``keywords_dictionary`` if given.
+    """
 
     def _apply_french_transation(field):
         if not field or 'en' not in field:
@@ -96,10 +181,17 @@ def get_french_translated_cioos_record(record):
         return field
 
     logger.debug("Translating record: {}", record)
-    record["title"] = _apply_french_transation(record["title"])
-    record["abstract"] = _apply_french_transation(record["abstract"])
-    record["limitations"] = _apply_french_transation(record.get("limitations"))
-    record["comments"] = _apply_french_transation(record.get("comments"))
+    # records converted with a subset of fields may miss some of them
+    for name in ("title", "abstract", "limitations", "comments"):
+        if name in record:
+            record[name] = _apply_french_transation(record[name])
+
+    if keywords_dictionary is not None and record.get("keywords"):
+        record["keywords"]["fr"] = [
+            keywords_dictionary[keyword.strip()]
+            for keyword in record["keywords"].get("en", [])
+            if keyword and keyword.strip() in keywords_dictionary
+        ]
 
     for item in record.get('distributions', []):
         item['name'] = _apply_french_transation(item['name'])
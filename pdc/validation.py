@@ -0,0 +1,154 @@
+"""Validate PDC metadata records and their converted CIOOS records.
+
+Input records are checked against the required paths of the mapping spec
+(``mapping.yaml``) and output records against ``cioos_record_schema.yaml``.
+Both validators are compiled once per process and reused, which keeps them
+cheap to run over thousands of records within a worker pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from pathlib import Path
+
+import yaml
+from loguru import logger
+from lxml import etree as ET
+
+from pdc.mapping import get_mapping
+
+CIOOS_RECORD_SCHEMA_FILE = Path(__file__).parent / "cioos_record_schema.yaml"
+
+JSON_TYPES = {
+    "string": (str,),
+    "array": (list,),
+    "object": (dict,),
+    "boolean": (bool,),
+    "number": (int, float),
+    "null": (type(None),),
+}
+
+
+def _has_text(elements) -> bool:
+    return any(element.text and element.text.strip() for element in elements)
+
+
+def _validate_section(item, mapping, section: str, location: str) -> list[str]:
+    """Check the required fields of a mapping section within an element."""
+    errors = []
+    for name, field in mapping[section].items():
+        elements = field.xpath(item)
+        if field.required and not (
+            elements if field.select in ("element", "elements") else _has_text(elements)
+        ):
+            errors.append(f"{location}: missing required {name} ({field.path})")
+        if field.section:
+            for index, element in enumerate(elements):
+                errors += _validate_section(
+                    element, mapping, field.section, f"{location}/{name}[{index}]"
+                )
+    return errors
+
+
+def validate_xml(file, xml_format: str = "iso") -> list[str]:
+    """Validate a PDC xml metadata record and return the list of errors."""
+    mapping = get_mapping(xml_format)
+    try:
+        tree = ET.parse(file)
+    except (ET.XMLSyntaxError, OSError) as error:
+        return [f"invalid xml: {error}"]
+    return _validate_section(tree, mapping, "record", "record")
+
+
+def _compile_schema(schema: dict):
+    """Compile a schema into a function returning the errors of a value."""
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    python_types = tuple(
+        python_type for name in types or [] for python_type in JSON_TYPES[name]
+    )
+    enum = schema.get("enum")
+    min_length = schema.get("minLength")
+    required = schema.get("required", [])
+    properties = {
+        name: _compile_schema(subschema)
+        for name, subschema in schema.get("properties", {}).items()
+    }
+    items = _compile_schema(schema["items"]) if "items" in schema else None
+
+    def validate(value, location="record") -> list[str]:
+        if python_types and not isinstance(value, python_types):
+            return [
+                f"{location}: expected {' or '.join(types)}, got {type(value).__name__}"
+            ]
+        errors = []
+        if enum is not None and value not in enum:
+            errors.append(f"{location}: {value!r} is not one of {enum}")
+        if (
+            min_length is not None
+            and isinstance(value, str)
+            and len(value) < min_length
+        ):
+            errors.append(f"{location}: shorter than {min_length} characters")
+        if isinstance(value, dict):
+            errors += [
+                f"{location}: missing required {name}"
+                for name in required
+                if name not in value
+            ]
+            for name, validator in properties.items():
+                if name in value:
+                    errors += validator(value[name], f"{location}.{name}")
+        if items and isinstance(value, list):
+            for index, item in enumerate(value):
+                errors += items(item, f"{location}[{index}]")
+        return errors
+
+    return validate
+
+
+@lru_cache
+def get_record_validator():
+    """Load and compile the CIOOS record schema."""
+    with open(CIOOS_RECORD_SCHEMA_FILE) as f:
+        return _compile_schema(yaml.safe_load(f))
+
+
+def validate_record(record: dict) -> list[str]:
+    """Validate a converted CIOOS record and return the list of errors."""
+    return get_record_validator()(record)
+
+
+def validate_files(
+    files: list[Path], xml_format: str = "iso", workers: int = 1
+) -> dict[Path, list[str]]:
+    """Validate xml files in batch, optionally within a pool of processes."""
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                validate_xml,
+                files,
+                repeat(xml_format),
+                chunksize=max(1, len(files) // (workers * 4)),
+            )
+            return dict(zip(files, results))
+    return {file: validate_xml(file, xml_format) for file in files}
+
+
+def filter_valid_files(
+    files: list[Path], xml_format: str = "iso", workers: int = 1
+) -> tuple[list[Path], list[dict]]:
+    """Split files into the valid ones and a per-file report of the invalid ones."""
+    files = list(files)
+    valid, report = [], []
+    for file, errors in validate_files(files, xml_format, workers).items():
+        if not errors:
+            valid.append(file)
+            continue
+        logger.warning("Invalid {} record {}: {}", xml_format, file, "; ".join(errors))
+        report += [
+            {"file": str(file), "stage": "input", "error": error} for error in errors
+        ]
+    logger.info("{}/{} valid {} records", len(valid), len(files), xml_format)
+    return valid, report
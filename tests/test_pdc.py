@@ -1,9 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from glob import glob
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
 import os
+import pickle
+import threading
+from urllib.parse import urlparse
+import uuid
+from pathlib import Path
 
 import pytest
+from click.testing import CliRunner
+import requests
+from lxml import etree as ET
 
 import pdc.fgdc as fgdc
+import pdc.iso as pdc_iso_module
+import pdc.index as pdc_index
+import pdc.translate as pdc_translate
+from pdc.__main__ import (
+    CCIN_NAMESPACE,
+    cli,
+    collect_keywords,
+    download_records,
+    filter_shard,
+    get_record_converter,
+    watch_files,
+)
+from pdc.export import (
+    ShardWriter,
+    load_export,
+    is_record_changed,
+    record_fingerprint,
+)
+from pdc.checkpoint import Checkpoint
+from pdc.extract import ExtractCache, extract_record
+from pdc.firebase import FirebaseClient, publish as firebase_publish
+from pdc.mapping import get_mapping
+from pdc.regions import assign_regions
+from pdc.service import ConversionService
+from pdc.stub_server import StubServer
+from pdc.validation import filter_valid_files, validate_record, validate_xml
 from pdc.iso import PDC_ISO
 from pdc.translate import get_french_translated_cioos_record
 from dotenv import load_dotenv
@@ -13,6 +51,42 @@ load_dotenv()
 FGDC_TEST_FILES = glob("tests/files/pdc*fgdc.xml")
 ISO_TEST_FILES = glob("tests/files/pdc*iso.xml")
 
+
+@pytest.fixture
+def sample_files(tmp_path):
+    """Write copies of a sample record as ``{ccin}_{xml_format}.xml`` files."""
+
+    def _write(*ccins, xml_format="fgdc", replace=("", "")):
+        files = FGDC_TEST_FILES if xml_format == "fgdc" else ISO_TEST_FILES
+        source = Path(files[0]).read_text().replace(*replace)
+        for ccin in ccins:
+            (tmp_path / f"{ccin}_{xml_format}.xml").write_text(source)
+
+    return _write
+
+
+@pytest.fixture
+def run_convert(tmp_path):
+    """Run convert on the fgdc files of ``tmp_path``, checking its exit code."""
+
+    def _convert(output_file, *args, exit_code=0):
+        result = CliRunner().invoke(
+            cli,
+            [
+                "convert",
+                "--xml-format", "fgdc",
+                "--local-dir", str(tmp_path),
+                "--output-file", str(tmp_path / output_file),
+                *args,
+            ],
+        )
+        if exit_code is not None:
+            assert result.exit_code == exit_code, result.output
+        return result
+
+    return _convert
+
+
 def test_fgdc_files_exist():
     assert len(FGDC_TEST_FILES) > 0, "No FGDC files found in tests/files/"
     assert isinstance(FGDC_TEST_FILES, list), "FGDC_TEST_FILES should be a list"
@@ -86,4 +160,727 @@ def test_iso_xml_translation(file):
     assert result
     assert result["title"]["fr"]
     assert result["abstract"]["fr"]
-    assert result["limitations"]["fr"]
\ No newline at end of file
+    assert result["limitations"]["fr"]
+
+def test_shard_writer_splits_records(tmp_path):
+    with ShardWriter(tmp_path / "output.json", max_records=2, compress=True) as writer:
+        for i in range(5):
+            writer.add(f"key{i}", {"title": {"en": f"record {i}"}}, {"user": {"owner": {f"key{i}": {"shared": True}}}})
+    assert [file.name for file in writer.files] == [
+        "output-00000.json.gz",
+        "output-00001.json.gz",
+        "output-00002.json.gz",
+    ]
+    shard = load_export(writer.files[1])
+    assert list(shard["records"]) == ["key2", "key3"]
+    assert list(shard["shares"]["user"]["owner"]) == ["key2", "key3"]
+
+
+@pytest.mark.parametrize("wrap_in_list", [True, False])
+def test_shard_writer_max_bytes(tmp_path, wrap_in_list):
+    record = fgdc.main(FGDC_TEST_FILES[0], "user", "file", "ccin", "status", "CC-BY-4.0", "amundsen", "dataset", [])
+    max_bytes = 20000
+    with ShardWriter(tmp_path / "output.json", max_bytes=max_bytes, wrap_in_list=wrap_in_list) as writer:
+        for i in range(20):
+            shares = {share: {"owner": {f"key{i}": {"shared": True}}} for share in ("user1", "user2")}
+            writer.add(f"key{i}", record, shares)
+    sizes = [file.stat().st_size for file in writer.files]
+    assert len(sizes) > 1
+    assert max(sizes) <= max_bytes
+    # the next record would not have fit in the full shards
+    with ShardWriter(tmp_path / "single.json", wrap_in_list=wrap_in_list) as single:
+        single.add("key0", record, shares)
+    assert min(sizes[:-1]) + single.files[0].stat().st_size > max_bytes
+
+
+def test_convert_fgdc_append_to_gzip(tmp_path):
+    previous = tmp_path / "previous.json.gz"
+    with ShardWriter(previous) as writer:
+        writer.add("previous-key", {"title": {"en": "previous"}})
+
+    output_file = tmp_path / "output.json"
+    result = CliRunner().invoke(
+        cli,
+        [
+            "convert",
+            "--xml-format", "fgdc",
+            "--files", FGDC_TEST_FILES[0],
+            "--local-dir", str(tmp_path),
+            "--output-file", str(output_file),
+            "--append-to", str(previous),
+            "--shard-records", "1",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    files = sorted(tmp_path.glob("output-*.json"))
+    assert len(files) == 2
+    assert list(load_export(files[0])["records"]) == ["previous-key"]
+
+
+@pytest.mark.parametrize("xml_format", ["iso", "fgdc"])
+def test_mapping_is_compiled_once(xml_format):
+    assert get_mapping(xml_format) is get_mapping(xml_format)
+    assert get_mapping(xml_format)["record"]["title"].xpath is not None
+
+
+@pytest.mark.parametrize("file", ISO_TEST_FILES)
+def test_iso_mapping_extract(file):
+    fields = PDC_ISO(file).fields
+    assert fields["title"]
+    assert fields["keywords"]
+    assert fields["edition"]
+
+
+@pytest.mark.parametrize(
+    "file,xml_format",
+    [(file, "iso") for file in ISO_TEST_FILES]
+    + [(file, "fgdc") for file in FGDC_TEST_FILES],
+)
+def test_validate_xml(file, xml_format):
+    assert validate_xml(file, xml_format) == []
+
+
+def test_validate_xml_missing_required(tmp_path):
+    file = tmp_path / "missing_iso.xml"
+    file.write_text(
+        Path(ISO_TEST_FILES[0]).read_text().replace("gmd:purpose>", "gmd:notpurpose>")
+    )
+    broken = tmp_path / "broken_iso.xml"
+    broken.write_text("<gmd:MD_Metadata")
+
+    valid, report = filter_valid_files(
+        [Path(ISO_TEST_FILES[0]), file, broken], "iso", workers=2
+    )
+    assert valid == [Path(ISO_TEST_FILES[0])]
+    assert {item["file"] for item in report} == {str(file), str(broken)}
+    assert any("purpose" in item["error"] for item in report)
+
+
+def test_validate_command_fails_on_invalid_files(tmp_path):
+    broken = tmp_path / "broken_iso.xml"
+    broken.write_text("<gmd:MD_Metadata")
+    report = tmp_path / "report.md"
+    args = ["validate", "--files", ISO_TEST_FILES[0], "--report", str(report)]
+
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert not report.exists()
+
+    args[2] = str(tmp_path / "*_iso.xml")
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 1
+    assert "1 files failed validation" in result.output
+    assert report.exists()
+
+
+def test_validate_record():
+    record = fgdc.main(
+        FGDC_TEST_FILES[0],
+        "userID",
+        "filename",
+        "test-recordID",
+        "status",
+        "CC-BY-4.0",
+        "region",
+        ["dataset"],
+        ["sharedWith"],
+    )
+    assert validate_record(record) == []
+    record["title"] = {"en": None}
+    record.pop("recordID")
+    assert validate_record(record) == [
+        "record: missing required recordID",
+        "record.title.en: expected string, got NoneType",
+    ]
+
+
+class FakeRealtimeDatabase(BaseHTTPRequestHandler):
+    """Local stand-in of the Firebase Realtime Database REST API."""
+
+    data = {}
+    requests = []
+    fail_next = 0
+
+    def do_PATCH(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append((self.path, body))
+        if type(self).fail_next:
+            type(self).fail_next -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        base = urlparse(self.path).path.removesuffix(".json").strip("/")
+        for path, value in body.items():
+            node = self.data
+            *parents, leaf = [item for item in f"{base}/{path}".split("/") if item]
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            node[leaf] = value
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_database():
+    FakeRealtimeDatabase.data = {}
+    FakeRealtimeDatabase.requests = []
+    FakeRealtimeDatabase.fail_next = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRealtimeDatabase)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield FakeRealtimeDatabase, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_publish_batches_with_retry(fake_database):
+    database, url = fake_database
+    database.fail_next = 1
+    export = {
+        "records": {f"key{i}": {"title": {"en": f"record {i}"}} for i in range(5)},
+        "shares": {"share": {"owner": {"key0": {"shared": True}}}},
+    }
+    client = FirebaseClient(url, path="cioos", namespace="test", backoff=0)
+    published, errors = firebase_publish([export], client, batch_size=2, concurrency=2)
+
+    assert (published, errors) == (5, [])
+    assert len(database.requests) == 4  # 3 batches + 1 retry
+    assert database.requests[0][0].startswith("/cioos.json?ns=test")
+    assert set(database.data["cioos"]["records"]) == set(export["records"])
+    assert database.data["cioos"]["shares"] == export["shares"]
+
+
+def test_convert_delta(tmp_path, sample_files, run_convert):
+    sample_files("1", "2")
+
+    def _convert(output_file, *args):
+        run_convert(output_file, *args)
+        return load_export(tmp_path / output_file)["records"]
+
+    first = _convert("first.json", "--stable-ids")
+    second = _convert("second.json", "--stable-ids")
+    assert second == first
+    assert (tmp_path / "first.json").read_bytes() == (tmp_path / "second.json").read_bytes()
+    assert set(first) == {uuid.uuid5(CCIN_NAMESPACE, ccin).hex for ccin in ("1", "2")}
+
+    previous = ("--previous", str(tmp_path / "first.json"), "--delta")
+    assert _convert("delta.json", *previous) == {}
+
+    sample_files("2", replace=("<title>", "<title>Updated "))
+    delta = _convert("delta.json", *previous)
+    assert list(delta) == [uuid.uuid5(CCIN_NAMESPACE, "2").hex]
+    assert delta[uuid.uuid5(CCIN_NAMESPACE, "2").hex]["title"]["en"].startswith("Updated ")
+
+
+def test_is_record_changed():
+    previous = {"title": {"en": "title"}, "dateRevised": "2024-01-01"}
+    fingerprints = {"key": record_fingerprint(previous)}
+
+    assert not is_record_changed("key", dict(previous), fingerprints)
+    # a new revision date in the source record is a change
+    assert is_record_changed("key", {**previous, "dateRevised": "2025-01-01"}, fingerprints)
+    assert is_record_changed("key", {**previous, "title": {"en": "new"}}, fingerprints)
+    assert is_record_changed("new-key", previous, fingerprints)
+
+
+def test_convert_iso_stable_ids_identical(tmp_path, monkeypatch, sample_files):
+    monkeypatch.setattr(pdc_iso_module.PDC_ISO, "_get_doi", lambda self, *args, **kwargs: "")
+    sample_files("13172", xml_format="iso")
+    for output_file in ("first.json", "second.json"):
+        result = CliRunner().invoke(
+            cli,
+            [
+                "convert",
+                "--local-dir", str(tmp_path),
+                "--output-file", str(tmp_path / output_file),
+                "--stable-ids",
+            ],
+        )
+        assert result.exit_code == 0, result.output
+    assert (tmp_path / "first.json").read_bytes() == (tmp_path / "second.json").read_bytes()
+    record = next(iter(load_export(tmp_path / "first.json")["records"].values()))
+    assert record["dateRevised"] == record["datePublished"]
+
+
+@pytest.fixture
+def stub_server():
+    with StubServer("tests/files", error_rate=0.3, truncate_rate=0.2, seed=1) as stub:
+        yield stub
+
+
+def test_download_from_stub_with_faults(stub_server, tmp_path):
+    results = download_records(
+        ["13172", "00000"], "iso", tmp_path, base_url=stub_server.url, retries=10, backoff=0
+    )
+    assert [result["status"] for result in results] == [200, 404]
+    assert (tmp_path / "13172_iso.xml").read_bytes() == Path(ISO_TEST_FILES[0]).read_bytes()
+    assert not list(tmp_path.glob("*.part"))
+    assert stub_server.stats["errors"] + stub_server.stats["truncated"] > 0
+
+
+@pytest.mark.parametrize("file", ISO_TEST_FILES)
+def test_parse_iso_xml_with_stub_doi(file):
+    with StubServer("tests/files") as stub:
+        result = PDC_ISO(file).to_cioos(
+            "userID",
+            "filename",
+            "test-recordID",
+            "status",
+            "CC-BY-4.0",
+            "region",
+            [],
+            ["dataset"],
+            ["sharedWith"],
+            [],
+            ["eov"],
+            "identifier",
+            doi_base_url=stub.url,
+        )
+    assert result["datasetIdentifier"] == "https://doi.org/10.21963/13172"
+    assert validate_record(result) == []
+
+
+def test_loadtest():
+    result = CliRunner().invoke(
+        cli,
+        ["loadtest", "--corpus-dir", "tests/files", "--concurrency", "1,2", "--error-rate", "0.2", "--seed", "1", "--backoff", "0"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "records_per_s" in result.output
+
+
+def test_convert_checkpoint_resume(tmp_path, monkeypatch, sample_files, run_convert):
+    sample_files("1", "2")
+    args = ["--stable-ids", "--checkpoint", str(tmp_path / "journal.ndjson")]
+    parse_fgdc = fgdc.main
+    converted = []
+
+    def _crash_on_second_file(file, *args, **kwargs):
+        if converted:
+            raise KeyboardInterrupt()
+        converted.append(file.name)
+        return parse_fgdc(file, *args, **kwargs)
+
+    monkeypatch.setattr(fgdc, "main", _crash_on_second_file)
+    assert run_convert("output.json", *args, exit_code=None).exit_code != 0
+    assert len((tmp_path / "journal.ndjson").read_text().splitlines()) == 1
+
+    def _convert_once(file, *args, **kwargs):
+        assert file.name not in converted, "journaled file converted again"
+        return parse_fgdc(file, *args, **kwargs)
+
+    monkeypatch.setattr(fgdc, "main", _convert_once)
+    run_convert("output.json", *args, "--resume")
+    assert len(load_export(tmp_path / "output.json")["records"]) == 2
+
+
+def test_checkpoint_resume_after_incomplete_entry(tmp_path):
+    path = tmp_path / "journal.ndjson"
+    with Checkpoint(path) as checkpoint:
+        checkpoint.add("a.xml", "a", {"title": "a"})
+    # crash while writing the entry of b.xml
+    with open(path, "a") as f:
+        f.write('{"file": "b.xml", "key": "b", "rec')
+
+    with Checkpoint(path, resume=True) as checkpoint:
+        assert checkpoint.done == {"a.xml"}
+        checkpoint.add("b.xml", "b", {"title": "b"})
+        checkpoint.add("c.xml", "c", {"title": "c"})
+    with Checkpoint(path, resume=True) as checkpoint:
+        assert checkpoint.done == {"a.xml", "b.xml", "c.xml"}
+        assert [key for key, _ in checkpoint.records()] == ["a", "b", "c"]
+
+
+def test_checkpoint_records_last_entry_of_files(tmp_path):
+    with Checkpoint(tmp_path / "journal.ndjson") as checkpoint:
+        checkpoint.add("a.xml", "a", {"title": "a"})
+        checkpoint.add("b.xml", "b", {"title": "b"})
+        checkpoint.add("a.xml", "a", {"title": "updated a"})
+    with Checkpoint(tmp_path / "journal.ndjson", resume=True) as checkpoint:
+        assert list(checkpoint.records()) == [
+            ("b", {"title": "b"}),
+            ("a", {"title": "updated a"}),
+        ]
+
+
+def test_convert_quarantine(tmp_path, sample_files, run_convert):
+    sample_files("1")
+    sample_files("2", replace=("purpose>", "notpurpose>"))
+
+    def _convert(output_file, *args):
+        run_convert(output_file, "--quarantine-file", str(tmp_path / "quarantine.json"), *args)
+        return load_export(tmp_path / output_file)["records"]
+
+    assert len(_convert("output.json")) == 1
+    quarantine = json.loads((tmp_path / "quarantine.json").read_text())
+    assert [item["file"] for item in quarantine] == [str(tmp_path / "2_fgdc.xml")]
+    assert "Traceback" in quarantine[0]["traceback"]
+
+    # fix the file and only convert the quarantined one
+    sample_files("2")
+    (tmp_path / "quarantine.json").rename(tmp_path / "retry.json")
+    retried = _convert("retry_output.json", "--only-quarantined", str(tmp_path / "retry.json"))
+    assert len(retried) == 1
+    assert json.loads((tmp_path / "quarantine.json").read_text()) == []
+
+
+def test_index_and_query(tmp_path, sample_files):
+    sample_files("1", "2", xml_format="iso")
+    index_file = str(tmp_path / "index.sqlite")
+
+    with closing(pdc_index.connect(index_file)) as connection:
+        files = sorted(tmp_path.glob("*_iso.xml"))
+        assert pdc_index.update_index(connection, files)["added"] == 2
+        assert pdc_index.update_index(connection, files)["unchanged"] == 2
+
+        os.utime(files[1], (0, 0))
+        files[0].unlink()
+        stats = pdc_index.update_index(connection, files[1:])
+        assert (stats["updated"], stats["removed"]) == (1, 1)
+        assert connection.execute("SELECT count(*) FROM keywords WHERE path = ?", (str(files[0]),)).fetchone() == (0,)
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "inspect",
+            "--index-file", index_file,
+            "--query", "SELECT ccin, progress, north FROM records WHERE ccin NOT IN (SELECT r.ccin FROM records r JOIN keywords k ON r.path = k.path WHERE k.type = 'place')",
+            "--output-file", str(tmp_path / "query.json"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads((tmp_path / "query.json").read_text()) == []
+    with closing(pdc_index.connect(index_file, read_only=True)) as connection:
+        ccin, title, north = connection.execute("SELECT ccin, title, north FROM records").fetchone()
+    assert ccin == "2" and title and isinstance(north, float)
+
+
+def test_build_keywords_dictionary(tmp_path, monkeypatch):
+    dictionary_file = tmp_path / "keywords_dictionary.csv"
+    dictionary_file.write_text("en,fr\nSea ice,Glace de mer\n")
+    requests_sent = []
+
+    def _fake_translate(text, source_language, target_language, terminology_name=None):
+        requests_sent.append((text, terminology_name))
+        return "\n".join(f"fr {line}" for line in text.split("\n"))
+
+    monkeypatch.setattr(pdc_translate, "translate", _fake_translate)
+    monkeypatch.setattr(pdc_translate, "TERMINOLOGY_CSV", "pdc-terminology")
+    keywords = collect_keywords([Path(file) for file in ISO_TEST_FILES], "iso")
+    dictionary = pdc_translate.build_keywords_dictionary(
+        list(keywords) + ["Sea ice", " Sea ice "], path=dictionary_file
+    )
+
+    assert len(requests_sent) == 1
+    assert "Sea ice" not in requests_sent[0][0]
+    assert requests_sent[0][1] == "pdc-terminology"
+    assert dictionary["Sea ice"] == "Glace de mer"
+    assert set(dictionary) == keywords | {"Sea ice"}
+    assert pdc_translate.load_keywords_dictionary(dictionary_file) == dictionary
+
+    # Known terms are not translated again
+    pdc_translate.build_keywords_dictionary(keywords, path=dictionary_file)
+    assert len(requests_sent) == 1
+
+    record = {"title": {}, "abstract": {}, "keywords": {"en": sorted(keywords), "fr": []}}
+    record = pdc_translate.get_french_translated_cioos_record(record, dictionary)
+    assert record["keywords"]["fr"] == [dictionary[keyword] for keyword in sorted(keywords)]
+
+
+def test_assign_regions():
+    regions = assign_regions(
+        north=[75, 50, 48, 50, None, "72"],
+        south=[70, 48, 47, 42, None, "70"],
+        east=[-90, -128, -69, -55, None, "-165"],
+        west=[-100, -135, -70, -65, None, "175"],
+    )
+    assert regions == [
+        ["amundsen"], ["pacific"], ["stlaurent"], ["stlaurent", "atlantic"], [], ["amundsen"],
+    ]
+
+
+def test_convert_region_auto(tmp_path):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "convert",
+            "--xml-format", "fgdc",
+            "--files", FGDC_TEST_FILES[0],
+            "--local-dir", str(tmp_path),
+            "--output-file", str(tmp_path / "output.json"),
+            "--region", "auto",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    fields = fgdc.get_fields(FGDC_TEST_FILES[0])
+    expected = assign_regions(
+        [fields["north"]], [fields["south"]], [fields["east"]], [fields["west"]]
+    )[0] or ["amundsen"]
+    records = load_export(tmp_path / "output.json")["records"]
+    assert [record["region"] for record in records.values()] == expected[:1]
+
+
+def test_to_cioos_fields_projection(monkeypatch):
+    def _no_network(*args, **kwargs):
+        raise AssertionError("DOI lookup of a projected record")
+
+    monkeypatch.setattr(requests, "get", _no_network)
+    pdc_iso = PDC_ISO(ISO_TEST_FILES[0])
+    record = pdc_iso.to_cioos(
+        "user", "file", "ccin", "submitted", "CC-BY-4.0", "amundsen",
+        [], [], [], [], [], uuid.uuid4(), fields=["keywords", "eov"],
+    )
+    assert set(record) == {"keywords", "eov"}
+    assert record["keywords"]["en"] == pdc_iso.fields["keywords"]
+    assert "title" not in pdc_iso.fields._values
+    with pytest.raises(ValueError, match="unknown"):
+        pdc_iso.to_cioos(
+            "user", "file", "ccin", "submitted", "CC-BY-4.0", "amundsen",
+            [], [], [], [], [], uuid.uuid4(), fields=["unknown"],
+        )
+
+
+def test_inspect_fields(tmp_path):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "inspect",
+            "--files", FGDC_TEST_FILES[0],
+            "--xml-format", "fgdc",
+            "--fields", "title,map",
+            "--output-file", str(tmp_path / "fields.json"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    results = json.loads((tmp_path / "fields.json").read_text())
+    assert set(results[FGDC_TEST_FILES[0]]) == {"title", "map"}
+
+
+@pytest.mark.parametrize("command", ["convert", "inspect"])
+def test_unknown_fields_usage_error(tmp_path, command):
+    result = CliRunner().invoke(
+        cli,
+        [
+            command,
+            *(["--local-dir", str(tmp_path)] if command == "convert" else []),
+            "--files", FGDC_TEST_FILES[0],
+            "--xml-format", "fgdc",
+            "--fields", "title,unknown",
+            "--output-file", str(tmp_path / "output.json"),
+        ],
+    )
+    assert result.exit_code == 2
+    assert "Unknown fgdc record fields: unknown" in result.output
+    assert not (tmp_path / "output.json").exists()
+
+
+def test_convert_watch(tmp_path, monkeypatch, sample_files, run_convert):
+    sample_files("1", "2")
+    polls = []
+
+    def _drop_files(seconds):
+        # first poll: a curator updates a record and adds a new one
+        if polls:
+            raise KeyboardInterrupt()
+        polls.append(seconds)
+        sample_files("1", replace=("<title>", "<title>Updated "))
+        sample_files("3")
+
+    monkeypatch.setattr("pdc.__main__.sleep", _drop_files)
+    run_convert("output.json", "--watch", "--watch-interval", "0.5")
+    assert polls == [0.5]
+    initial = load_export(tmp_path / "output-00000.json")["records"]
+    changes = load_export(tmp_path / "output-00001.json")["records"]
+    assert len(initial) == 2 and len(changes) == 2
+    assert sorted(record["filename"] for record in changes.values()) == ["1_fgdc.xml", "3_fgdc.xml"]
+    updated_key = next(key for key, record in changes.items() if record["filename"] == "1_fgdc.xml")
+    assert updated_key in initial
+    assert changes[updated_key]["title"]["en"].startswith("Updated")
+
+    # the updated record is in both shards, merged to its latest version
+    merge = ["merge", "--files", str(tmp_path / "output-*.json"), "--output-file", str(tmp_path / "merged.json")]
+    assert CliRunner().invoke(cli, merge).exit_code != 0
+    result = CliRunner().invoke(cli, [*merge, "--keep-latest"])
+    assert result.exit_code == 0, result.output
+    merged = load_export(tmp_path / "merged.json")["records"]
+    assert len(merged) == 3
+    assert merged[updated_key]["title"]["en"].startswith("Updated")
+
+
+def test_convert_watch_clears_fixed_quarantined_files(tmp_path, monkeypatch, sample_files, run_convert):
+    sample_files("1")
+    # still being written during the initial conversion
+    sample_files("2", replace=("purpose>", "notpurpose>"))
+    polls = []
+
+    def _complete_file(seconds):
+        if polls:
+            raise KeyboardInterrupt()
+        polls.append(seconds)
+        sample_files("2")
+
+    monkeypatch.setattr("pdc.__main__.sleep", _complete_file)
+    quarantine_file = tmp_path / "quarantine.json"
+    run_convert("output.json", "--watch", "--quarantine-file", str(quarantine_file))
+    assert not quarantine_file.exists()
+    changes = load_export(tmp_path / "output-00001.json")["records"]
+    assert [record["filename"] for record in changes.values()] == ["2_fgdc.xml"]
+
+
+def test_watch_files_keeps_polling_on_errors(tmp_path):
+    file = tmp_path / "1_fgdc.xml"
+    listings = iter([OSError("unavailable"), [file], [file]])
+
+    def _list_files():
+        listing = next(listings)
+        if isinstance(listing, Exception):
+            raise listing
+        return listing
+
+    file.write_text("<metadata/>")
+    changes = watch_files(_list_files, {}, interval=0)
+    assert next(changes) == [file]
+    file.write_text("<metadata>modified</metadata>")
+    assert next(changes) == [file]
+
+
+def test_shard_convert_and_merge(tmp_path, sample_files, run_convert):
+    ccins = [str(ccin) for ccin in range(10)]
+    sample_files(*ccins)
+    shards = [filter_shard(ccins, (index, 3)) for index in range(3)]
+    assert sorted(sum(shards, [])) == ccins
+    assert filter_shard(ccins, (1, 3)) == shards[1]
+
+    runner = CliRunner()
+    for index in range(3):
+        run_convert(f"shard-{index}.json", "--stable-ids", "--shard", f"{index}/3")
+        records = load_export(tmp_path / f"shard-{index}.json")["records"]
+        assert sorted(record["recordID"] for record in records.values()) == sorted(shards[index])
+
+    result = runner.invoke(
+        cli,
+        ["merge", "--files", str(tmp_path / "shard-*.json"), "--output-file", str(tmp_path / "merged.json")],
+    )
+    assert result.exit_code == 0, result.output
+    assert len(load_export(tmp_path / "merged.json")["records"]) == 10
+
+    # the merged file duplicates all the shards records
+    result = runner.invoke(
+        cli,
+        ["merge", "--files", str(tmp_path / "*.json"), "--output-file", str(tmp_path / "all.json")],
+    )
+    assert result.exit_code != 0
+    assert not (tmp_path / "all.json").exists()
+    assert runner.invoke(cli, ["convert", "--shard", "3/3"]).exit_code == 2
+
+
+@pytest.mark.parametrize("xml_format", ["fgdc", "iso"])
+def test_pdc_prefixed_file_keys_match_service(tmp_path, monkeypatch, xml_format):
+    monkeypatch.setattr(pdc_iso_module.PDC_ISO, "_get_doi", lambda self, *args, **kwargs: "")
+    file = (FGDC_TEST_FILES if xml_format == "fgdc" else ISO_TEST_FILES)[0]
+    result = CliRunner().invoke(
+        cli,
+        [
+            "convert",
+            "--xml-format", xml_format,
+            "--local-dir", str(tmp_path),
+            "--files", file,
+            "--stable-ids",
+            "--output-file", str(tmp_path / "output.json"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    records = load_export(tmp_path / "output.json")["records"]
+    key, record = get_record_converter()(
+        Path(file).read_bytes(), {"format": xml_format, "ccin": "13172"}
+    )
+    assert list(records) == [key]
+    assert records[key]["recordID"] == record["recordID"] == "13172"
+
+
+def test_conversion_service_concurrent_requests():
+    fgdc_xml = Path(FGDC_TEST_FILES[0]).read_bytes()
+    iso_xml = Path(ISO_TEST_FILES[0]).read_bytes()
+    with ConversionService(get_record_converter(user="user")) as service:
+
+        def _post(index):
+            return requests.post(
+                f"{service.url}/convert",
+                params={"format": "fgdc", "ccin": str(index % 2)},
+                data=fgdc_xml,
+                timeout=30,
+            )
+
+        with ThreadPoolExecutor(8) as executor:
+            responses = list(executor.map(_post, range(16)))
+        assert all(response.status_code == 200 for response in responses)
+        assert float(responses[0].headers["X-Conversion-Time"]) > 0
+        keys = {response.json()["key"] for response in responses}
+        assert keys == {uuid.uuid5(CCIN_NAMESPACE, ccin).hex for ccin in ("0", "1")}
+        assert responses[0].json()["record"]["title"]["en"]
+
+        response = requests.post(
+            f"{service.url}/convert",
+            params={"ccin": "13172", "fields": "keywords,eov"},
+            data=iso_xml,
+            timeout=30,
+        )
+        assert set(response.json()["record"]) == {"keywords", "eov"}
+        response = requests.post(f"{service.url}/convert", data=b"<not xml", timeout=30)
+        assert response.status_code == 400
+
+        stats = requests.get(f"{service.url}/stats", timeout=30).json()
+        assert (stats["requests"], stats["errors"]) == (18, 1)
+        assert 0 < stats["latency_mean"] <= stats["latency_max"]
+
+
+def test_record_converter_caches_resolved_dois(monkeypatch):
+    iso_xml = Path(ISO_TEST_FILES[0]).read_bytes()
+    convert = get_record_converter()
+    with StubServer("tests/files") as stub:
+        monkeypatch.setenv("DOI_BASE_URL", stub.url)
+        _, record = convert(iso_xml, {"format": "iso", "ccin": "13172"})
+        requests_sent = stub.stats["requests"]
+        _, second = convert(iso_xml, {"format": "iso", "ccin": "13172"})
+    assert record["datasetIdentifier"] == "https://doi.org/10.21963/13172"
+    assert second["datasetIdentifier"] == record["datasetIdentifier"]
+    assert stub.stats["requests"] == requests_sent > 0
+
+
+@pytest.mark.parametrize("xml_format", ["iso", "fgdc"])
+def test_extract_cache_maps_without_parsing(tmp_path, monkeypatch, xml_format):
+    source = Path(ISO_TEST_FILES[0] if xml_format == "iso" else FGDC_TEST_FILES[0])
+    file = tmp_path / f"1_{xml_format}.xml"
+    file.write_bytes(source.read_bytes())
+    cache = ExtractCache(tmp_path / "cache")
+    extracted = cache.get(file, xml_format)
+    assert extracted == extract_record(file, xml_format)
+    pickle.dumps(extracted)
+
+    # mapping changes only rerun the map stage
+    monkeypatch.setattr(ET, "parse", lambda *args: pytest.fail("xml parsed again"))
+    assert ExtractCache(tmp_path / "cache").get(file, xml_format) == extracted
+    if xml_format == "iso":
+        monkeypatch.setitem(pdc_iso_module.MAP_ISO_STATUS, "underDevelopment", "planned")
+        record = PDC_ISO(file, extracted=extracted).to_cioos(
+            "user", file.name, "1", "submitted", "CC-BY-4.0", "amundsen",
+            [], [], [], [], [], uuid.uuid4(), fields=["progress", "contacts", "eov"],
+        )
+        assert record["progress"] == "planned"
+        assert record["contacts"] and record["eov"]
+    else:
+        record = fgdc.main(
+            file, "user", file.name, "1", "status", "CC-BY-4.0", "amundsen", "dataset", [],
+            extracted=extracted,
+        )
+        assert record["contact"] and record["title"]["en"]
+
+    # modified files are extracted again
+    monkeypatch.undo()
+    os.utime(file, ns=(0, 0))
+    cache.get(file, xml_format)
+    assert cache.stats == {"hits": 0, "misses": 2}